@@ -1,19 +1,23 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*
-from queue import Queue
-from evomin.config import config
-from evomin.exceptions import EvominNotAByteException
+from collections import deque
+from queue import Queue, Full
+from typing import Union
+from evomin.config import DEFAULT_CONFIG
+from evomin.exceptions import EvominBufferOverflowException, EvominNotAByteException
 
 
 class EvominBuffer:
 
-    def __init__(self, initial_bytes: bytes = bytes([])):
-        self.buffer: Queue = Queue(maxsize=config['frame']['buffer_size'])
+    def __init__(self, initial_bytes: bytes = bytes([]), maxsize: int = DEFAULT_CONFIG.buffer_size):
+        self.buffer: Queue = Queue(maxsize=maxsize)
         try:
-            [self.buffer.put(b) for b in initial_bytes]
+            [self.buffer.put_nowait(b) for b in initial_bytes]
         except TypeError:
             # If no initial bytes were given, skip
             pass
+        except Full:
+            raise EvominBufferOverflowException('Initial bytes exceed the buffer size of {} bytes'.format(maxsize))
 
     @property
     def size(self):
@@ -21,7 +25,7 @@ class EvominBuffer:
 
     def push(self, byte: int):
         if byte in range(256):
-            self.buffer.put(byte)
+            self.buffer.put_nowait(byte)
         else:
             raise EvominNotAByteException('Payload byte must be a valid byte between 0..255')
 
@@ -30,3 +34,59 @@ class EvominBuffer:
 
     def reset(self):
         self.buffer.queue.clear()
+
+
+class EvominReplyBuffer:
+    """
+    Reply bytes of a slave in a master-slave communication.
+    Pushed data is referenced (not copied) and sent in segments of up to MAX_SEGMENT_SIZE bytes, each preceded by its
+    length. A full segment is followed by the length of the next one, so replies can be of any size.
+    """
+    MAX_SEGMENT_SIZE = 255
+
+    def __init__(self):
+        self.chunks: deque = deque()
+        self.offset: int = 0
+        self._size: int = 0
+        self.segment_left: int = 0
+        self.has_next_segment: bool = False
+
+    @property
+    def size(self):
+        return self._size
+
+    def push(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        """
+        Append reply data without copying it, so don't modify a pushed bytearray / memoryview until it's sent
+        """
+        view: memoryview = memoryview(data).cast('B')
+        if len(view):
+            self.chunks.append(view)
+            self._size += len(view)
+
+    def next_segment(self) -> int:
+        """
+        Start the next segment
+        :return: The length of the segment to be announced to the master
+        """
+        self.segment_left = min(self._size, self.MAX_SEGMENT_SIZE)
+        self.has_next_segment = self.segment_left == self.MAX_SEGMENT_SIZE
+        return self.segment_left
+
+    def get(self) -> int:
+        chunk: memoryview = self.chunks[0]
+        byte: int = chunk[self.offset]
+        self.offset += 1
+        if self.offset == len(chunk):
+            self.chunks.popleft()
+            self.offset = 0
+        self._size -= 1
+        self.segment_left -= 1
+        return byte
+
+    def reset(self):
+        self.chunks.clear()
+        self.offset = 0
+        self._size = 0
+        self.segment_left = 0
+        self.has_next_segment = False
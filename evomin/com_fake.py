@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*
-from typing import Generator, Optional
+from __future__ import annotations
+from collections import deque
+from typing import Generator, Optional, Tuple, TYPE_CHECKING
 from evomin.communication import EvominComInterface, ComDescription
+from evomin.frame import EvominFrameMessageType
+if TYPE_CHECKING:
+    # Prevent circular dependencies due to type hinting
+    from evomin.evomin import Evomin
 
 
 class EvominFakeSPIInterface(EvominComInterface):
@@ -37,3 +43,78 @@ class EvominFakeSPIInterface(EvominComInterface):
         for b in self.test_data:
             yield b
         return
+
+
+class EvominFakeUARTInterface(EvominComInterface):
+    """
+    Fake implementation of the EvominComInterface to connect two evomin instances in memory, like two UART devices
+    with crossed RX / TX lines. Every participant can send bytes independently. Use pair() to create both ends.
+    """
+    def __init__(self, rx: deque, tx: deque):
+        self.rx: deque = rx
+        self.tx: deque = tx
+
+    @classmethod
+    def pair(cls) -> Tuple[EvominFakeUARTInterface, EvominFakeUARTInterface]:
+        a_to_b: deque = deque()
+        b_to_a: deque = deque()
+        return cls(rx=b_to_a, tx=a_to_b), cls(rx=a_to_b, tx=b_to_a)
+
+    def describe(self):
+        return ComDescription(is_master_slave=False)
+
+    def send_byte(self, byte: int) -> Optional[int]:
+        self.tx.append(byte)
+        return None
+
+    def send_bytes(self, data: bytes) -> None:
+        self.tx.extend(data)
+
+    def receive_byte(self) -> Generator[int, None, None]:
+        while True:
+            yield self.rx.popleft() if self.rx else -1
+
+
+class EvominFakeSPIBus(EvominComInterface):
+    """
+    Fake implementation of the EvominComInterface to connect a master and a slave evomin instance in memory, like a
+    SPI bus. The master side is the bus itself: every byte it sends is clocked into the slave (refer to
+    Evomin.process_byte()), while the byte the slave has prepared in its TX register is clocked out and returned.
+    The slave uses the interface returned by slave_interface.
+    """
+    class SlaveInterface(EvominComInterface):
+        """Slave end of the fake SPI bus, send_byte() only fills the TX register"""
+        def __init__(self):
+            self.tx_register: int = EvominFrameMessageType.DUMMY
+
+        def describe(self):
+            return ComDescription(is_master_slave=True)
+
+        def send_byte(self, byte: int) -> Optional[int]:
+            self.tx_register = byte
+            return None
+
+        def receive_byte(self) -> Generator[int, None, None]:
+            while True:
+                yield -1
+
+    def __init__(self):
+        self.slave_interface: EvominFakeSPIBus.SlaveInterface = self.SlaveInterface()
+        self.slave: Optional[Evomin] = None
+
+    def attach(self, slave: Evomin) -> None:
+        self.slave = slave
+
+    def describe(self):
+        return ComDescription(is_master_slave=True)
+
+    def send_byte(self, byte: int) -> Optional[int]:
+        byte_in: int = self.slave_interface.tx_register
+        self.slave_interface.tx_register = EvominFrameMessageType.DUMMY
+        if self.slave is not None:
+            self.slave.process_byte(byte)
+        return byte_in
+
+    def receive_byte(self) -> Generator[int, None, None]:
+        while True:
+            yield -1
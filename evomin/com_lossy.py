@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import random
+import time
+from collections import deque
+from typing import Callable, Generator, Optional
+from evomin.communication import EvominComInterface
+
+
+class EvominSimClock:
+    """
+    Simulated monotonic clock in seconds. Pass the same instance to the Evomin interfaces (clock=..) and to the
+    EvominLossyInterface, so resend timing, latency and bandwidth limits are simulated without actually waiting.
+    """
+    def __init__(self, start: float = 0.0) -> None:
+        self.now: float = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class EvominChannelModel:
+    """
+    Impairments of a single direction of a communication channel.
+    bit_error_rate: Probability of every single bit to be flipped
+    drop_rate: Probability of a byte to be lost
+    duplicate_rate: Probability of a byte to be received twice
+    burst_rate: Probability of a burst error to start at any byte (Gilbert-Elliott model)
+    burst_length: Mean length of a burst in bytes
+    burst_bit_error_rate: Bit error rate while inside a burst
+    latency: Propagation delay in seconds (non master-slave only, a master-slave bus is clocked by the master)
+    bandwidth: Line rate in bytes per second, None for unlimited
+    """
+    def __init__(self, bit_error_rate: float = 0.0, drop_rate: float = 0.0, duplicate_rate: float = 0.0,
+                 burst_rate: float = 0.0, burst_length: float = 8.0, burst_bit_error_rate: float = 0.5,
+                 latency: float = 0.0, bandwidth: Optional[float] = None) -> None:
+        self.bit_error_rate: float = bit_error_rate
+        self.drop_rate: float = drop_rate
+        self.duplicate_rate: float = duplicate_rate
+        self.burst_rate: float = burst_rate
+        self.burst_length: float = burst_length
+        self.burst_bit_error_rate: float = burst_bit_error_rate
+        self.latency: float = latency
+        self.bandwidth: Optional[float] = bandwidth
+
+    @property
+    def byte_time(self) -> float:
+        return 1.0 / self.bandwidth if self.bandwidth else 0.0
+
+
+class EvominChannelStats:
+    """Counters of the impairments applied by an EvominLossyInterface"""
+    def __init__(self) -> None:
+        self.bytes: int = 0
+        self.bit_errors: int = 0
+        self.corrupted_bytes: int = 0
+        self.dropped_bytes: int = 0
+        self.duplicated_bytes: int = 0
+        self.burst_bytes: int = 0
+
+    def __repr__(self) -> str:
+        return 'EvominChannelStats(bytes={b}, corrupted={c}, bit_errors={e}, dropped={d}, duplicated={u}, ' \
+               'in_burst={i})'.format(b=self.bytes, c=self.corrupted_bytes, e=self.bit_errors, d=self.dropped_bytes,
+                                      u=self.duplicated_bytes, i=self.burst_bytes)
+
+
+class EvominLossyInterface(EvominComInterface):
+    """
+    Channel-model wrapper around any EvominComInterface to measure the protocol under realistic line noise.
+    In a non master-slave setup (i.e. UART), the outgoing bytes are impaired and only handed to the wrapped interface
+    once they have arrived (latency, bandwidth), so wrap both participants' interfaces to impair both directions.
+    In a master-slave setup, both the byte clocked out by the master and the slave's response are impaired, and the
+    bandwidth limit is applied per clocked byte.
+    All randomness comes from a private random.Random(seed), so runs are reproducible.
+    """
+    def __init__(self, com_interface: EvominComInterface, model: EvominChannelModel, seed: Optional[int] = None,
+                 clock: Optional[Callable[[], float]] = None) -> None:
+        """
+        :param com_interface: The wrapped communication interface
+        :param model: Impairments to be applied
+        :param seed: Seed for reproducible runs
+        :param clock: Time source, use an EvominSimClock to simulate time instead of waiting (defaults to real time)
+        """
+        self.com_interface: EvominComInterface = com_interface
+        self.model: EvominChannelModel = model
+        self.random: random.Random = random.Random(seed)
+        self.clock: Callable[[], float] = clock if clock is not None else time.monotonic
+        self.stats: EvominChannelStats = EvominChannelStats()
+        self.is_master_slave: bool = com_interface.describe().is_master_slave
+        self.in_burst: bool = False
+        self.line_free_at: float = 0.0
+        self.in_flight: deque = deque()
+
+    def describe(self):
+        return self.com_interface.describe()
+
+    def send_byte(self, byte: int) -> Optional[int]:
+        if self.is_master_slave:
+            return self._clock_byte(byte)
+
+        self._deliver()
+        now: float = self.clock()
+        start: float = max(now, self.line_free_at)
+        self.line_free_at = start + self.model.byte_time
+        arrival: float = self.line_free_at + self.model.latency
+        for b in self._impair(byte):
+            self.in_flight.append((arrival, b))
+        self._deliver()
+        return None
+
+    def receive_byte(self) -> Generator[int, None, None]:
+        for byte in self.com_interface.receive_byte():
+            self._deliver()
+            yield byte
+
+    def _clock_byte(self, byte: int) -> Optional[int]:
+        self._wait(self.model.byte_time)
+        byte_in: Optional[int] = None
+        for b in self._impair(byte):
+            byte_in = self.com_interface.send_byte(b)
+        if byte_in is None:
+            return None
+        impaired: list = self._impair(byte_in)
+        return impaired[-1] if impaired else None
+
+    def _deliver(self) -> None:
+        """Hand all bytes that have arrived by now to the wrapped interface"""
+        if not self.in_flight:
+            return
+        now: float = self.clock()
+        while self.in_flight and self.in_flight[0][0] <= now:
+            self.com_interface.send_byte(self.in_flight.popleft()[1])
+
+    def _wait(self, seconds: float) -> None:
+        if not seconds:
+            return
+        if isinstance(self.clock, EvominSimClock):
+            self.clock.advance(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _impair(self, byte: int) -> list:
+        """
+        Apply the channel model to a single byte
+        :return: The received bytes (none if dropped, two if duplicated)
+        """
+        model: EvominChannelModel = self.model
+        rnd: Callable[[], float] = self.random.random
+        self.stats.bytes += 1
+
+        # Gilbert-Elliott burst model: switch between the good and the bad (burst) channel state
+        if self.in_burst:
+            if rnd() < 1.0 / max(model.burst_length, 1.0):
+                self.in_burst = False
+        elif model.burst_rate and rnd() < model.burst_rate:
+            self.in_burst = True
+
+        if model.drop_rate and rnd() < model.drop_rate:
+            self.stats.dropped_bytes += 1
+            return []
+
+        bit_error_rate: float = model.bit_error_rate
+        if self.in_burst:
+            self.stats.burst_bytes += 1
+            bit_error_rate = model.burst_bit_error_rate
+        if bit_error_rate:
+            flipped: int = 0
+            for bit in range(8):
+                if rnd() < bit_error_rate:
+                    byte ^= 1 << bit
+                    flipped += 1
+            if flipped:
+                self.stats.bit_errors += flipped
+                self.stats.corrupted_bytes += 1
+
+        if model.duplicate_rate and rnd() < model.duplicate_rate:
+            self.stats.duplicated_bytes += 1
+            return [byte, byte]
+        return [byte]
@@ -26,6 +26,17 @@ class EvominComInterface(ABC):
         """
         pass
 
+    def send_bytes(self, data: bytes) -> None:
+        """
+        Gets automatically called through the evomin interface in order to send several bytes at once, i.e. a whole
+        frame or a batch of frames. Override this method if the low-level device supports buffered writes (i.e. a
+        single write() call on a serial port or DMA), by default every byte is sent using send_byte(..).
+        Bytes returned by the slave during this transfer (master-slave only) are discarded.
+        :param data: The bytes to be sent
+        """
+        for b in data:
+            self.send_byte(b)
+
     @abstractmethod
     def receive_byte(self) -> Generator[int, None, None]:
         """
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import lzma
+import zlib
+from enum import Enum
+from typing import Iterable, Optional, Tuple, Union
+from evomin.exceptions import EvominCompressionException
+from evomin.frame import EvominFrame, EvominFrameCommandType
+
+# Version of the capability handshake payload
+CAPABILITIES_VERSION: int = 1
+# Capability flag: the announcement is a response to the peer's announcement
+CAPABILITIES_FLAG_RESPONSE: int = 0x01
+# Bytes on the wire besides the (stuffed) payload: 3x SOF, command, length, CRC, EOF
+FRAME_OVERHEAD: int = 7
+# Bytes prepended to a compressed payload: original command, codec
+COMPRESSED_HEADER_SIZE: int = 2
+
+# Frames carry at most 255 bytes, so a 4 KiB dictionary yields the same output as the default 64 MiB one, without the
+# ~674 MiB encoder allocation per call. Both peers (encoder and decoder) must use the same filters
+_LZMA_FILTERS: list = [{'id': lzma.FILTER_LZMA2, 'preset': 9 | lzma.PRESET_EXTREME, 'dict_size': 4096}]
+
+
+class EvominCompressionCodec(Enum):
+    """
+    EvominCompressionCodec defines the payload compression algorithms that can be negotiated between two peers.
+    NONE: Payload is sent uncompressed
+    ZLIB: Raw deflate stream (no zlib header / checksum, the frame has its own CRC)
+    LZMA: Raw LZMA2 stream (no xz container)
+    ZLIB_DICT: Raw deflate stream primed with a pre-trained dictionary shared by both peers (best for small frames)
+    """
+    NONE = 0
+    ZLIB = 1
+    LZMA = 2
+    ZLIB_DICT = 3
+
+
+class EvominCompressionStats:
+    """
+    Counters of the compression stage of a single link.
+    Wire sizes include the frame overhead and the stuff bytes inserted for the payload.
+    """
+    def __init__(self) -> None:
+        self.frames_compressed: int = 0
+        self.frames_uncompressed: int = 0
+        self.frames_decompressed: int = 0
+        self.payload_bytes_in: int = 0
+        self.payload_bytes_out: int = 0
+        self.wire_bytes_raw: int = 0
+        self.wire_bytes_sent: int = 0
+
+    @property
+    def compression_ratio(self) -> float:
+        """Uncompressed / compressed payload size of all compressed frames (i.e. 2.5 -> 2.5x smaller)"""
+        return self.payload_bytes_in / self.payload_bytes_out if self.payload_bytes_out else 1.0
+
+    @property
+    def goodput_gain(self) -> float:
+        """Wire bytes that would have been sent without compression / actually sent wire bytes, over all frames"""
+        return self.wire_bytes_raw / self.wire_bytes_sent if self.wire_bytes_sent else 1.0
+
+    def __repr__(self) -> str:
+        return 'EvominCompressionStats(compressed={c}, uncompressed={u}, decompressed={d}, ' \
+               'compression_ratio={r:.2f}, goodput_gain={g:.2f})'.format(c=self.frames_compressed,
+                                                                         u=self.frames_uncompressed,
+                                                                         d=self.frames_decompressed,
+                                                                         r=self.compression_ratio,
+                                                                         g=self.goodput_gain)
+
+
+class EvominCompressor:
+    """
+    Optional payload compression stage between Evomin.send() and the frame encoder (and between the frame decoder
+    and frame_received() on reception).
+    Compression is only used after the peer announced its codecs through the capability handshake
+    (refer to Evomin.negotiate_compression()), so peers without compression support are never sent compressed frames.
+    Only frames with an opted-in command and a payload of at least `threshold` bytes are compressed, and a frame is
+    sent uncompressed whenever compression wouldn't make it smaller.
+    """
+    def __init__(self,
+                 commands: Iterable[Union[EvominFrameCommandType, int]],
+                 codecs: Iterable[EvominCompressionCodec] = (EvominCompressionCodec.ZLIB_DICT,
+                                                             EvominCompressionCodec.ZLIB,
+                                                             EvominCompressionCodec.LZMA),
+                 threshold: int = 16,
+                 dictionary: Optional[bytes] = None,
+                 level: int = 9) -> None:
+        """
+        :param commands: Commands whose payload may be compressed
+        :param codecs: Supported codecs in order of preference
+        :param threshold: Minimum payload size in bytes, smaller payloads are never compressed
+        :param dictionary: Pre-trained dictionary for ZLIB_DICT, must be identical on both peers
+        :param level: zlib compression level
+        """
+        self.commands: frozenset = frozenset(c.value if isinstance(c, EvominFrameCommandType) else c for c in commands)
+        self.codecs: Tuple[EvominCompressionCodec, ...] = tuple(
+            c for c in codecs
+            if c is not EvominCompressionCodec.NONE and (c is not EvominCompressionCodec.ZLIB_DICT or dictionary)
+        )
+        self.threshold: int = threshold
+        self.dictionary: Optional[bytes] = dictionary
+        self.dictionary_id: int = zlib.adler32(dictionary) if dictionary else 0
+        self.level: int = level
+        self.codec: Optional[EvominCompressionCodec] = None
+        self.stats: EvominCompressionStats = EvominCompressionStats()
+
+    @property
+    def codec_mask(self) -> int:
+        mask: int = 0
+        for c in self.codecs:
+            mask |= 1 << c.value
+        return mask
+
+    def capabilities(self, is_response: bool = False) -> bytes:
+        """
+        Build the payload of a CAPABILITIES frame:
+        version, flags, codec bit mask, dictionary id (adler32, big endian)
+        """
+        return bytes([CAPABILITIES_VERSION, CAPABILITIES_FLAG_RESPONSE if is_response else 0, self.codec_mask]) \
+            + self.dictionary_id.to_bytes(4, 'big')
+
+    def handle_capabilities(self, payload: bytes) -> bool:
+        """
+        Process the peer's capability announcement and select the codec for this link.
+        :param payload: Payload of the received CAPABILITIES frame (or the slave's reply to it)
+        :return: Whether the announcement needs to be answered with our own capabilities
+        """
+        if len(payload) < 7 or payload[0] != CAPABILITIES_VERSION:
+            raise EvominCompressionException('Unsupported capability announcement')
+        peer_mask: int = payload[2]
+        peer_dictionary_id: int = int.from_bytes(payload[3:7], 'big')
+        self.codec = None
+        for c in self.codecs:
+            if c is EvominCompressionCodec.ZLIB_DICT and peer_dictionary_id != self.dictionary_id:
+                continue
+            if peer_mask & (1 << c.value):
+                self.codec = c
+                break
+        return not payload[1] & CAPABILITIES_FLAG_RESPONSE
+
+    def reset(self) -> None:
+        """Forget the negotiated codec, i.e. when the link has been re-established"""
+        self.codec = None
+
+    def compress(self, command: int, payload: bytes) -> Tuple[int, bytes]:
+        """
+        Compress the payload if possible.
+        :return: The command and payload to be put into the EvominSendFrame
+        """
+        payload = bytes(payload)
+        wire_raw: int = FRAME_OVERHEAD + EvominFrame.stuffed_length(payload)
+        self.stats.wire_bytes_raw += wire_raw
+
+        if self.codec is not None and command in self.commands and len(payload) >= self.threshold:
+            compressed: bytes = bytes([command, self.codec.value]) + self._compress(self.codec, payload)
+            if len(compressed) < len(payload):
+                self.stats.frames_compressed += 1
+                self.stats.payload_bytes_in += len(payload)
+                self.stats.payload_bytes_out += len(compressed)
+                self.stats.wire_bytes_sent += FRAME_OVERHEAD + EvominFrame.stuffed_length(compressed)
+                return EvominFrameCommandType.COMPRESSED.value, compressed
+
+        self.stats.frames_uncompressed += 1
+        self.stats.wire_bytes_sent += wire_raw
+        return command, payload
+
+    def decompress(self, payload: bytes, max_length: int) -> Tuple[int, bytes]:
+        """
+        Unwrap a received COMPRESSED payload.
+        :param payload: Payload of the COMPRESSED frame
+        :param max_length: Maximum size of the decompressed payload
+        :return: The original command and payload
+        """
+        if len(payload) < COMPRESSED_HEADER_SIZE:
+            raise EvominCompressionException('Compressed payload too short')
+        try:
+            codec: EvominCompressionCodec = EvominCompressionCodec(payload[1])
+        except ValueError:
+            raise EvominCompressionException('Unknown compression codec {}'.format(payload[1]))
+        if codec is not EvominCompressionCodec.NONE and codec not in self.codecs:
+            raise EvominCompressionException('Compression codec {} not supported'.format(codec.name))
+
+        decompressed: bytes = self._decompress(codec, payload[COMPRESSED_HEADER_SIZE:], max_length)
+        self.stats.frames_decompressed += 1
+        return payload[0], decompressed
+
+    def _compress(self, codec: EvominCompressionCodec, payload: bytes) -> bytes:
+        if codec is EvominCompressionCodec.LZMA:
+            return lzma.compress(payload, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+        if codec is EvominCompressionCodec.ZLIB_DICT:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return compressor.compress(payload) + compressor.flush()
+
+    def _decompress(self, codec: EvominCompressionCodec, data: bytes, max_length: int) -> bytes:
+        if codec is EvominCompressionCodec.NONE:
+            result: bytes = data
+        else:
+            try:
+                if codec is EvominCompressionCodec.LZMA:
+                    decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+                elif codec is EvominCompressionCodec.ZLIB_DICT:
+                    decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+                else:
+                    decompressor = zlib.decompressobj(-15)
+                # Never inflate more than the receive buffer can hold
+                result = decompressor.decompress(data, max_length + 1)
+            except (zlib.error, lzma.LZMAError) as e:
+                raise EvominCompressionException('Corrupt compressed payload: {}'.format(e))
+        if len(result) > max_length:
+            raise EvominCompressionException('Decompressed payload exceeds {} bytes'.format(max_length))
+        return result
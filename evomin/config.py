@@ -1,6 +1,110 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*
-import yaml
 import os
+from typing import Any, Optional, Tuple
 
-config = yaml.safe_load(open(os.path.join(os.path.dirname(__file__), 'config.yml')))
+DEFAULT_CONFIG_FILE: str = os.path.join(os.path.dirname(__file__), 'config.yml')
+
+
+# Single source of all settings: attribute name, (section, key) within config.yml and the default value.
+# EvominConfig's attributes, its defaults and the YAML mapping of from_dict(..) are all derived from this table.
+CONFIG_FIELDS: Tuple[Tuple[str, Tuple[str, str], Any], ...] = (
+    ('max_queued_frames', ('interface', 'max_queued_frames'), 5),
+    ('resend_min_time', ('interface', 'resend_min_time'), 1),
+    # Maximum number of frames sent with a single write in non master-slave mode, 0 for all due frames
+    ('max_coalesced_frames', ('interface', 'max_coalesced_frames'), 1),
+    ('buffer_size', ('frame', 'buffer_size'), 50),
+    ('retry_count', ('frame', 'retry_count'), 3),
+    ('use_logging', ('logging', 'use_logging'), True),
+    ('log_file', ('logging', 'file'), 'evomin.log'),
+)
+
+
+class EvominConfig:
+    """
+    Immutable per-instance configuration of an Evomin interface.
+    The nested config.yml layout is resolved once into plain attributes, so hot paths (frame construction, polling)
+    don't need to perform any nested dictionary lookups.
+    Build an instance from keyword arguments (any attribute of CONFIG_FIELDS), from a dictionary (same layout as
+    config.yml) or from a YAML file. PyYAML is only imported when a YAML file is actually loaded.
+    The defaults are defined by CONFIG_FIELDS, the packaged config.yml only mirrors them and is not read implicitly.
+    """
+    __slots__ = tuple(name for name, _, _ in CONFIG_FIELDS)
+
+    def __init__(self, **kwargs: Any) -> None:
+        unknown: set = set(kwargs) - set(self.__slots__)
+        if unknown:
+            raise TypeError('Unknown configuration value(s): {}'.format(', '.join(sorted(unknown))))
+        for name, _, default in CONFIG_FIELDS:
+            object.__setattr__(self, name, kwargs.get(name, default))
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        raise AttributeError('EvominConfig is immutable, use replace(..) to derive a modified copy')
+
+    def __delattr__(self, key: str) -> None:
+        raise AttributeError('EvominConfig is immutable')
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, EvominConfig):
+            return NotImplemented
+        return self.as_kwargs() == other.as_kwargs()
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.as_kwargs().items()))
+
+    def __repr__(self) -> str:
+        return 'EvominConfig({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in self.as_kwargs().items()))
+
+    def as_kwargs(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def replace(self, **kwargs) -> 'EvominConfig':
+        """
+        Derive a new configuration with some of the values replaced.
+        :param kwargs: Any of the constructor arguments
+        :return: A new EvominConfig instance
+        """
+        values: dict = self.as_kwargs()
+        values.update(kwargs)
+        return EvominConfig(**values)
+
+    @classmethod
+    def from_dict(cls, config_dict: dict) -> 'EvominConfig':
+        """
+        Build a configuration from a nested dictionary using the config.yml layout.
+        Missing sections or keys fall back to the defaults.
+        :param config_dict: i.e. {'interface': {'max_queued_frames': 5}, 'frame': {'retry_count': 3}}
+        """
+        values: dict = {}
+        for name, (section, key), _ in CONFIG_FIELDS:
+            section_dict: dict = config_dict.get(section) or {}
+            if key in section_dict:
+                values[name] = section_dict[key]
+        return cls(**values)
+
+    @classmethod
+    def from_yaml(cls, path: Optional[str] = None) -> 'EvominConfig':
+        """
+        Load a configuration from a YAML file (PyYAML is imported lazily).
+        :param path: Path to the YAML file, defaults to the packaged config.yml
+        """
+        return cls.from_dict(load_yaml(path))
+
+
+def load_yaml(path: Optional[str] = None) -> dict:
+    import yaml
+
+    with open(path or DEFAULT_CONFIG_FILE) as f:
+        return yaml.safe_load(f) or {}
+
+
+DEFAULT_CONFIG: EvominConfig = EvominConfig()
+
+
+def __getattr__(name: str) -> Any:
+    # Backwards compatibility: the raw ``config`` dictionary is only loaded from config.yml on first access
+    if name == 'config':
+        value: dict = load_yaml()
+        globals()['config'] = value
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -1,14 +1,23 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*
 from __future__ import annotations
-from datetime import datetime
+from collections import deque
 from enum import Enum
+from time import monotonic
+from typing import Callable, Iterable, List, Tuple, Union, TYPE_CHECKING
+from evomin.buffer import EvominReplyBuffer
 from evomin.communication import EvominComInterface
 from queue import Queue, Full
-from evomin.config import config
+from evomin.config import EvominConfig, DEFAULT_CONFIG
+from evomin.exceptions import EvominCompressionException
 from evomin.frame import EvominFrame, EvominFrameMessageType, EvominFrameCommandType, EvominSendFrame
 from evomin.state import *
 import logging
+if TYPE_CHECKING:
+    # Optional stages are only imported by the user when enabled, as they load heavy modules (lzma, mmap, cProfile)
+    from evomin.compression import EvominCompressor
+    from evomin.profiling import EvominProfiler
+    from evomin.spool import EvominSpool
 
 
 class EvominState(Enum):
@@ -61,6 +70,7 @@ class StateMachine:
         self.state_crc_fail = self.StateCRCFail(self, evomin_interface)
         self.state_eof = self.StateEof(self, evomin_interface, EvominFrameMessageType.EOF)
         self.state_reply = self.StateReply(self, evomin_interface)
+        self.state_reply_end = self.StateReplyEnd(self, evomin_interface)
         self.state_error = self.StateError(self, evomin_interface)
         self.interface = evomin_interface
         self.current_state: State = self.state_idle
@@ -73,20 +83,42 @@ class StateMachine:
         Run the current state (code execution and state translation)
         :param byte: current received byte (from the low-level receive handler)
         """
-        self.current_state = self.current_state.run(byte)
+        profiler: Optional[EvominProfiler] = self.interface.profiler
+        if profiler is None:
+            self.current_state = self.current_state.run(byte)
+        else:
+            state: State = self.current_state
+            token: Tuple[float, float] = profiler.mark()
+            self.current_state = state.run(byte)
+            profiler.add_state(type(state).__name__, profiler.elapsed(token))
 
     class StateWaitingForACK(State):
         """Waiting for ACK in non master-slave mode"""
-        def proceed(self, byte: int) -> State:
-            previous_frame: EvominSendFrame = self.interface.frame_send_queue.queue[0]
-            if previous_frame is not None and previous_frame.waiting_for_ack:
-                previous_frame.is_sent = True
-            else:
-                return self.fail()
+        def run(self, byte: int) -> State:
+            if byte == EvominFrameMessageType.SOF:
+                # The peer starts sending a frame of its own instead of acknowledging ours
+                self.interface.abort_ack_batch()
+                return self.state_machine.state_sof
+            return super().run(byte)
 
+        def proceed(self, byte: int) -> State:
+            # ACKs carry no reference to their frame, so a batch of frames sent with a single write only counts as
+            # sent once every frame of it has been acknowledged
+            interface: Evomin = self.interface
+            interface.acks_received += 1
+            if interface.acks_received < len(interface.ack_batch):
+                return self
+            for frame in interface.ack_batch:
+                frame.attempts += 1
+                frame.is_sent = True
+                frame.waiting_for_ack = False
+                interface.frame_acknowledged(frame)
+            interface.ack_batch = []
             return self.state_machine.state_idle
 
         def fail(self) -> State:
+            # Anything but an ACK: it's unknown which frames made it, so the whole batch is sent again
+            self.interface.abort_ack_batch()
             return self.state_machine.state_error
 
     class StateIdle(State):
@@ -117,7 +149,7 @@ class StateMachine:
         """Reading in command identifier"""
         def proceed(self, byte: int) -> State:
             # Initialize a new EvominFrame
-            self.interface.current_frame = EvominFrame(command=byte)
+            self.interface.current_frame = EvominFrame(command=byte, config=self.interface.config)
             return self.state_machine.state_len
 
         def fail(self) -> State:
@@ -133,7 +165,7 @@ class StateMachine:
                 if not self.interface.current_frame.payload_length and self.interface.com_interface.describe().is_master_slave:
                     # On a master-slave communication interface, call the frame_received handler early, to allow
                     # the slave to prepare a reply
-                    self.interface.frame_received(self.interface.current_frame)
+                    self.interface.dispatch_frame(self.interface.current_frame)
                 return self.state_machine.state_crc
 
         def fail(self) -> State:
@@ -163,7 +195,7 @@ class StateMachine:
                         if self.interface.com_interface.describe().is_master_slave:
                             # On a master-slave communication interface, call the frame_received handler early, to allow
                             # the slave to prepare a reply
-                            self.interface.frame_received(self.interface.current_frame)
+                            self.interface.dispatch_frame(self.interface.current_frame)
                         return self.state_machine.state_crc
 
                     else:
@@ -212,13 +244,13 @@ class StateMachine:
         def proceed(self, byte: int) -> State:
             if self.interface.current_frame.is_valid:
                 if self.interface.com_interface.describe().is_master_slave:
-                    # Send number of reply bytes
-                    self.interface.com_interface.send_byte(self.interface.current_frame.answer_buffer.size)
+                    # Send number of reply bytes (of the first segment)
+                    self.interface.com_interface.send_byte(self.interface.current_frame.answer_buffer.next_segment())
                     return self.state_machine.state_reply
                 else:
                     # Send ACK
                     self.interface.com_interface.send_byte(EvominFrameMessageType.ACK)
-                    self.interface.frame_received(self.state_machine.interface.current_frame)
+                    self.interface.dispatch_frame(self.state_machine.interface.current_frame)
                     return self.state_machine.state_idle
             else:
                 return self.fail()
@@ -232,11 +264,26 @@ class StateMachine:
         using the provided reply(..) method within the frame_received(..) handler.
         """
         def proceed(self, byte: int) -> State:
-            if self.interface.current_frame.answer_buffer.size:
+            answer_buffer: EvominReplyBuffer = self.interface.current_frame.answer_buffer
+            if answer_buffer.segment_left:
                 # Pop byte
-                reply_byte: int = self.interface.current_frame.answer_buffer.get()
-                self.interface.com_interface.send_byte(reply_byte)
+                self.interface.com_interface.send_byte(answer_buffer.get())
                 return self
+            if answer_buffer.has_next_segment:
+                # A full segment has been sent, announce the length of the next one
+                self.interface.com_interface.send_byte(answer_buffer.next_segment())
+                return self
+            return self.state_machine.state_reply_end
+
+        def fail(self) -> State:
+            return self.state_machine.state_error
+
+    class StateReplyEnd(State):
+        """Waiting for the master's closing ACK / NACK after the reply bytes in a master-slave communication"""
+        def proceed(self, byte: int) -> State:
+            if byte == EvominFrameMessageType.SOF:
+                # The closing byte got lost, this is already the start of the next frame
+                return self.state_machine.state_sof
             return self.state_machine.state_idle
 
         def fail(self) -> State:
@@ -250,6 +297,9 @@ class StateMachine:
         def proceed(self, byte: int) -> State:
             # TODO: Check if additional NACK is required here?
             self.interface.log_error('Error while frame reception, discard data')
+            if byte == EvominFrameMessageType.SOF:
+                # Resynchronize on the start of the next frame instead of discarding it
+                return self.state_machine.state_sof
             return self.state_machine.state_idle
 
         def fail(self) -> State:
@@ -263,14 +313,30 @@ class Evomin(ABC):
     """
     SELF_VERSION = '0.1'
 
-    def __init__(self, com_interface: EvominComInterface) -> None:
+    def __init__(self, com_interface: EvominComInterface, config: Optional[EvominConfig] = None,
+                 compressor: Optional[EvominCompressor] = None, clock: Optional[Callable[[], float]] = None,
+                 spool: Optional[EvominSpool] = None, profiler: Optional[EvominProfiler] = None) -> None:
         """
         Initialize the evomin communication interface
         :param com_interface: An instance of a communication interface implementation (refer to EvominComInterface)
+        :param config: Per-instance configuration (refer to EvominConfig), defaults to the built-in defaults
+        :param compressor: Optional payload compression stage (refer to EvominCompressor)
+        :param clock: Monotonic time source in seconds used for resend timing, defaults to time.monotonic
+        :param spool: Optional disk-backed overflow of the send queue (refer to EvominSpool)
+        :param profiler: Optional profiling of the state machine, sending and user callbacks (refer to EvominProfiler)
         """
+        self.config: EvominConfig = config if config is not None else DEFAULT_CONFIG
         self.com_interface: EvominComInterface = com_interface
-        self.frame_send_queue: Queue = Queue(maxsize=config['interface']['max_queued_frames'])
+        self.compressor: Optional[EvominCompressor] = compressor
+        self.clock: Callable[[], float] = clock if clock is not None else monotonic
+        self.spool: Optional[EvominSpool] = spool
+        self.profiler: Optional[EvominProfiler] = profiler
+        self.frame_send_queue: Queue = Queue(maxsize=self.config.max_queued_frames)
         self.current_frame = None
+        self.reply_assembly: bytearray = bytearray()
+        # Frames of the last write in non master-slave mode still waiting for their ACKs
+        self.ack_batch: List[EvominSendFrame] = []
+        self.acks_received: int = 0
         self.state: StateMachine = StateMachine(self)
         self.byte_getter = self.com_interface.receive_byte()
 
@@ -281,9 +347,9 @@ class Evomin(ABC):
         self.log_debug('* Closed communication interface *')
 
     def _init_logger(self):
-        self.enabled = config['logging']['use_logging']
+        self.enabled = self.config.use_logging
         if self.enabled:
-            logging.basicConfig(level=logging.DEBUG, filename=config['logging']['file'], format='%(asctime)s - %(message)s')
+            logging.basicConfig(level=logging.DEBUG, filename=self.config.log_file, format='%(asctime)s - %(message)s')
 
     def log_debug(self, message: str) -> None:
         if self.enabled:
@@ -303,18 +369,76 @@ class Evomin(ABC):
             # as the slave can only reply directly to a master's message
             self._rx_handler()
 
+        if self.spool is not None and len(self.spool):
+            self._promote_spooled_frames()
+
         # Check for queued frames to be sent
         if not self.frame_send_queue.empty():
-            oldest_frame_peek: EvominSendFrame = self.frame_send_queue.queue[0]
-            # Check if last try happened a while ago
-            if datetime.now().timestamp() - oldest_frame_peek.previous_timestamp.timestamp() >= config['interface']['resend_min_time']:
-                if not oldest_frame_peek.is_sent:
-                    oldest_frame: EvominSendFrame = self.frame_send_queue.queue.popleft()
-                    oldest_frame.previous_timestamp = datetime.now()
-                    self._send_lowlevel(oldest_frame)
-                else:
-                    # Frame has already been sent, drop it
-                    self.frame_send_queue.queue.popleft()
+            if self.com_interface.describe().is_master_slave:
+                self._poll_send_oldest()
+            else:
+                self._poll_send_due()
+
+    def _promote_spooled_frames(self) -> None:
+        """
+        Move the oldest spooled frames into the free slots of the send queue. Nothing is moved while the oldest queued
+        frame is failing (i.e. the peer is offline), so the backlog stays on disk instead of running through the
+        retries in memory
+        """
+        queue: Queue = self.frame_send_queue
+        with queue.mutex:
+            if queue.queue:
+                head: EvominSendFrame = queue.queue[0]
+                if not head.is_sent and head.attempts:
+                    return
+            promoted: int = 0
+            while len(self.spool) and (queue.maxsize <= 0 or len(queue.queue) < queue.maxsize):
+                position, encoded = self.spool.read()
+                frame: EvominSendFrame = EvominSendFrame.from_encoded(encoded, self.config)
+                frame.spool_position = position
+                # Spooled frames have been waiting long enough already, send them right away
+                frame.previous_timestamp = self.clock() - self.config.resend_min_time
+                queue.queue.append(frame)
+                promoted += 1
+            if promoted:
+                queue.unfinished_tasks += promoted
+                queue.not_empty.notify(promoted)
+
+    def _poll_send_oldest(self) -> None:
+        """Send the oldest queued frame, every frame needs its own ACK / reply exchange in master-slave mode"""
+        oldest_frame_peek: EvominSendFrame = self.frame_send_queue.queue[0]
+        # Check if last try happened a while ago
+        if self.clock() - oldest_frame_peek.previous_timestamp >= self.config.resend_min_time:
+            if not oldest_frame_peek.is_sent:
+                oldest_frame: EvominSendFrame = self.frame_send_queue.queue.popleft()
+                oldest_frame.previous_timestamp = self.clock()
+                self._send_lowlevel(oldest_frame)
+            else:
+                # Frame has already been sent, drop it
+                self.frame_send_queue.queue.popleft()
+
+    def _poll_send_due(self) -> None:
+        """Send all queued frames that are due at once (from the head of the queue on), keeping the order"""
+        now: float = self.clock()
+        if self.ack_batch and now - self.ack_batch[0].previous_timestamp >= self.config.resend_min_time:
+            # The ACKs of the last write didn't arrive in time
+            self.abort_ack_batch()
+        due: List[EvominSendFrame] = []
+        with self.frame_send_queue.mutex:
+            for frame in self.frame_send_queue.queue:
+                if frame.is_sent:
+                    continue
+                # Check if last try happened a while ago, frames behind one that isn't due yet have to wait
+                if now - frame.previous_timestamp < self.config.resend_min_time:
+                    break
+                frame.previous_timestamp = now
+                due.append(frame)
+                if len(due) == self.config.max_coalesced_frames:
+                    break
+            self._purge_send_queue()
+        # Write without holding the lock, so producers calling send() aren't blocked by the transport
+        if due:
+            self._send_lowlevel_many(due)
 
     def _rx_handler(self) -> None:
         """
@@ -325,17 +449,91 @@ class Evomin(ABC):
             incoming_byte: int = next(self.byte_getter)
             if incoming_byte >= 0:
                 # Byte received
-                print("Received byte: ", incoming_byte)
-                self.state.run(incoming_byte)
-
-                if self.current_frame:
-                    self.current_frame.last_byte = incoming_byte
+                self.process_byte(incoming_byte)
         except StopIteration:
             pass
 
-    def reply(self, reply_bytes: bytes) -> None:
-        if len(reply_bytes):
-            [self.current_frame.answer_buffer.push(b) for b in reply_bytes]
+    def process_byte(self, byte: int) -> None:
+        """
+        Feed a single received byte into the internal state machine.
+        This is done by poll() in a non master-slave setup. A slave in a master-slave setup never polls for received
+        bytes, so call this from your low-level receive handler instead (i.e. the SPI receive interrupt).
+        :param byte: The received byte
+        """
+        self.state.run(byte)
+
+        if self.current_frame:
+            self.current_frame.last_byte = byte
+
+    def reply(self, reply_bytes: Union[bytes, bytearray, memoryview]) -> None:
+        """
+        Reply directly to the master's frame (master-slave only), call this within frame_received(..).
+        The data is referenced without copying and may be of any size; call reply(..) multiple times to append.
+        :param reply_bytes: The reply data, don't modify a bytearray / memoryview until it has been sent
+        """
+        self.current_frame.answer_buffer.push(reply_bytes)
+
+    def dispatch_frame(self, frame: EvominFrame) -> None:
+        """
+        Called by the state machine for every received frame. Handles the protocol internal frames (capability
+        handshake, compressed payloads) and passes everything else on to frame_received(..).
+        """
+        if frame.command == EvominFrameCommandType.CAPABILITIES.value:
+            self._capabilities_received(bytes(frame.get_payload()))
+            return
+
+        if frame.command == EvominFrameCommandType.COMPRESSED.value:
+            if self.compressor is None:
+                self.log_error('Compressed frame received, but compression is not enabled')
+                return
+            try:
+                command, payload = self.compressor.decompress(bytes(frame.get_payload()), self.config.buffer_size)
+            except EvominCompressionException as e:
+                self.log_error('Compressed frame dropped: {}'.format(e))
+                return
+            decompressed_frame: EvominFrame = EvominFrame(command, payload, self.config)
+            # Keep the answer buffer of the received frame, so reply(..) works as usual
+            decompressed_frame.answer_buffer = frame.answer_buffer
+            frame = decompressed_frame
+
+        if self.profiler is None:
+            self.frame_received(frame)
+        else:
+            self.profiler.run_callback('frame_received', self.frame_received, frame)
+
+    def negotiate_compression(self) -> bool:
+        """
+        Start the compression capability handshake by announcing our codecs to the peer.
+        Until the peer has answered, all frames are sent uncompressed. In a master-slave setup, only the master
+        can start the handshake. The peer must run this version of evomin or later, older versions can't process the
+        CAPABILITIES frame.
+        :return: Whether the announcement could be enqueued or not
+        """
+        if self.compressor is None:
+            return False
+        self.compressor.reset()
+        return self._queue_frame(EvominSendFrame(EvominFrameCommandType.CAPABILITIES.value,
+                                                 self.compressor.capabilities(), self.config))
+
+    def _capabilities_received(self, payload: bytes) -> None:
+        if self.compressor is None:
+            # Peers without compression simply never answer the handshake
+            self.log_debug('Capability announcement ignored, compression is not enabled')
+            return
+        try:
+            needs_response: bool = self.compressor.handle_capabilities(payload)
+        except EvominCompressionException as e:
+            self.log_error('Capability announcement dropped: {}'.format(e))
+            return
+        self.log_debug('Compression negotiated: {}'.format(self.compressor.codec))
+
+        if needs_response:
+            response: bytes = self.compressor.capabilities(is_response=True)
+            if self.com_interface.describe().is_master_slave:
+                # The slave answers directly on the master's announcement
+                self.reply(response)
+            else:
+                self._queue_frame(EvominSendFrame(EvominFrameCommandType.CAPABILITIES.value, response, self.config))
 
     @abstractmethod
     def frame_received(self, frame: EvominFrame) -> None:
@@ -357,72 +555,245 @@ class Evomin(ABC):
         """
         pass
 
+    def reply_chunk_received(self, chunk: bytearray, offset: int, is_last: bool) -> None:
+        """
+        Gets called for every received segment (up to 255 bytes) of a slave's reply in a master-slave setup.
+        Override this method to process large replies incrementally instead of buffering them.
+        The default implementation collects all segments and passes the complete reply on to reply_received(..),
+        a reply consisting of a single segment is passed on without copying.
+        :param chunk: The received segment
+        :param offset: Position of the segment within the whole reply
+        :param is_last: Whether this is the last segment of the reply
+        """
+        if not offset:
+            if is_last:
+                self.reply_received(chunk)
+                return
+            self.reply_assembly = bytearray()
+        self.reply_assembly += chunk
+        if is_last:
+            reply_payload: bytearray = self.reply_assembly
+            self.reply_assembly = bytearray()
+            self.reply_received(reply_payload)
+
     def _queue_frame(self, frame: EvominSendFrame) -> bool:
+        frame.previous_timestamp = self.clock()
+        if self.spool is not None:
+            return self._queue_frames([frame])
         # Ensure queue is not full
         try:
-            self.frame_send_queue.put(frame)
+            self.frame_send_queue.put_nowait(frame)
             return True
         except Full:
             self.log_error('Frame cannot be send, as the queue is full')
             return False
 
+    def _queue_frames(self, frames: List[EvominSendFrame]) -> bool:
+        """
+        Enqueue frames atomically, frames that don't fit into the send queue overflow to the spool (if any)
+        """
+        queue: Queue = self.frame_send_queue
+        with queue.mutex:
+            free: int = queue.maxsize - len(queue.queue) if queue.maxsize > 0 else len(frames)
+            if self.spool is not None and (len(self.spool) or free < len(frames)):
+                # Keep the order: as long as there are spooled frames, new frames are spooled as well
+                hot: int = 0 if len(self.spool) else free
+                try:
+                    if not self.spool.push_many([f.encode() for f in frames[hot:]]):
+                        self.log_error('Frame cannot be send, as the spool is full')
+                        return False
+                except OSError as e:
+                    self.log_error('Frame cannot be spooled: {}'.format(e))
+                    return False
+                frames = frames[:hot]
+            elif free < len(frames):
+                self.log_error('Frame cannot be send, as the queue is full')
+                return False
+            now: float = self.clock()
+            for frame in frames:
+                frame.previous_timestamp = now
+                queue.queue.append(frame)
+            if frames:
+                queue.unfinished_tasks += len(frames)
+                queue.not_empty.notify(len(frames))
+        return True
+
     def _send_lowlevel(self, frame: EvominSendFrame) -> None:
+        """
+        Send a single frame in master-slave mode, including the ACK / NACK and reply exchange with the slave
+        """
         if frame.retries_left:
-            # Send EvominFrame header
-            self.com_interface.send_byte(EvominFrameMessageType.SOF)
-            self.com_interface.send_byte(EvominFrameMessageType.SOF)
-            self.com_interface.send_byte(EvominFrameMessageType.SOF)
-            self.com_interface.send_byte(frame.command)
-            # Send payload length without the inserted stuff bytes (at this point, payload_length might differ
-            # from the real size of the payload buffer, but that's okay!
-            self.com_interface.send_byte(frame.payload_length)
-            # We actually send the whole payload including the inserted stuff bytes (if any), as the receiver
-            # will strip them out
-            for b in frame.get_payload():
-                self.com_interface.send_byte(b)
-
-            # Send checksum
-            self.com_interface.send_byte(frame.crc8)
+            profiler: Optional[EvominProfiler] = self.profiler
+            token: Optional[Tuple[float, float]] = None
+            if profiler is not None:
+                from evomin.profiling import EvominSendPhase
+                token = profiler.mark()
+            encoded: bytes = frame.encode()
+            if profiler is not None:
+                token = profiler.lap(EvominSendPhase.ENCODE, token)
+            # Send EvominFrame header, payload (including the inserted stuff bytes, if any, as the receiver will strip
+            # them out) and checksum in a single write
+            self.com_interface.send_bytes(encoded)
+            if profiler is not None:
+                token = profiler.lap(EvominSendPhase.WRITE, token)
 
             # Receive ACK / NACK from receiver in master-slave mode
             receiver_is_ack: bool = (self.com_interface.send_byte(EvominFrameMessageType.EOF) == EvominFrameMessageType.ACK)
-            if self.com_interface.describe().is_master_slave:
-                if receiver_is_ack:
-                    # Receiver replies with number of answer bytes it wants to send back on the second EOF
-                    receiver_answer_bytes: int = self.com_interface.send_byte(EvominFrameMessageType.EOF)
-                    if receiver_answer_bytes:
-                        # Fill reply buffer
-                        receiver_bytes_sent: int = 0
-                        reply_buffer: bytearray = bytearray()
-                        while receiver_bytes_sent < receiver_answer_bytes:
-                            reply_byte: int = self.com_interface.send_byte(EvominFrameMessageType.DUMMY)
-                            if reply_byte is not None and reply_byte in range(256):
-                                reply_buffer.append(reply_byte)
-                            receiver_bytes_sent += 1
-
-                        # Inform user that we've got a reply
-                        self.reply_received(reply_buffer)
-
-                    self.com_interface.send_byte(EvominFrameMessageType.ACK)
-                    frame.is_sent = True
-                else:
-                    self.com_interface.send_byte(EvominFrameMessageType.NACK)
-
+            if profiler is not None:
+                token = profiler.lap(EvominSendPhase.ACK_WAIT, token)
+            if receiver_is_ack:
+                # Receiver replies with number of answer bytes it wants to send back on the second EOF
+                receiver_answer_bytes: int = self.com_interface.send_byte(EvominFrameMessageType.EOF)
+                if receiver_answer_bytes:
+                    self._receive_reply(frame, receiver_answer_bytes)
+
+                self.com_interface.send_byte(EvominFrameMessageType.ACK)
+                frame.is_sent = True
+                self.frame_acknowledged(frame)
             else:
-                # In non-sync mode (master-slave, i.e. UART), set the internal state machine to waiting_for_ack
-                # as we expect to receive a ACK / NACK at the end of each transmission
-                frame.waiting_for_ack = True
-                self.state.current_state = self.state.state_waiting_for_ack
+                self.com_interface.send_byte(EvominFrameMessageType.NACK)
+            if profiler is not None:
+                profiler.lap(EvominSendPhase.REPLY, token)
 
             # Frame hasn't been sent, keep in queue
-            if not frame.is_sent and frame.retries_left - 1 > 0:
-                frame.retries_left -= 1
+            if self._keep_for_retry(frame):
                 # Enqueue frame again
                 self.frame_send_queue.queue.appendleft(frame)
-                return
+
+    def _send_lowlevel_many(self, frames: List[EvominSendFrame]) -> None:
+        """
+        Send frames in non master-slave mode (i.e. UART), coalesced into one contiguous buffer and a single write.
+        The receiver acknowledges every frame with an ACK, the frames only count as sent once all ACKs have arrived.
+        """
+        profiler: Optional[EvominProfiler] = self.profiler
+        token: Optional[Tuple[float, float]] = None
+        if profiler is not None:
+            from evomin.profiling import EvominSendPhase
+            token = profiler.mark()
+        # A batch that is still waiting for ACKs has timed out, its frames are part of this write again
+        self.abort_ack_batch()
+        buffer: bytearray = bytearray()
+        for frame in frames:
+            buffer += frame.encode()
+            buffer.append(EvominFrameMessageType.EOF)
+            frame.waiting_for_ack = True
+        self.ack_batch = list(frames)
+        self.acks_received = 0
+        if profiler is not None:
+            token = profiler.lap(EvominSendPhase.ENCODE, token)
+
+        # Set the internal state machine to waiting_for_ack before writing, as we expect to receive an ACK at the end
+        # of each transmission (a transport might deliver it right away)
+        self.state.current_state = self.state.state_waiting_for_ack
+        self.com_interface.send_bytes(bytes(buffer))
+        if profiler is not None:
+            profiler.lap(EvominSendPhase.WRITE, token)
+
+    def frame_acknowledged(self, frame: EvominSendFrame) -> None:
+        """
+        Called whenever the peer acknowledged a sent frame. Frames read from the spool are only removed from it now
+        """
+        if frame.spool_position is not None and self.spool is not None:
+            with self.frame_send_queue.mutex:
+                self.spool.consume(frame.spool_position)
+            frame.spool_position = None
+
+    def abort_ack_batch(self) -> None:
+        """
+        Give up waiting for the ACKs of the last write in non master-slave mode. Its frames stay queued to be resent,
+        unless they have run out of retries
+        """
+        batch: List[EvominSendFrame] = self.ack_batch
+        self.ack_batch = []
+        self.acks_received = 0
+        dropped: List[EvominSendFrame] = []
+        for frame in batch:
+            frame.waiting_for_ack = False
+            if not self._keep_for_retry(frame):
+                dropped.append(frame)
+        if dropped:
+            with self.frame_send_queue.mutex:
+                self._purge_send_queue(dropped)
+
+    def _purge_send_queue(self, dropped: Iterable[EvominSendFrame] = ()) -> None:
+        """
+        Remove the frames that have been sent, and the given dropped ones, from the send queue.
+        The caller needs to hold the send queue's lock.
+        """
+        dropped_ids: set = {id(frame) for frame in dropped}
+        queue: deque = self.frame_send_queue.queue
+        remaining: List[EvominSendFrame] = [f for f in queue if not f.is_sent and id(f) not in dropped_ids]
+        removed: int = len(queue) - len(remaining)
+        if removed:
+            queue.clear()
+            queue.extend(remaining)
+            self.frame_send_queue.unfinished_tasks = max(self.frame_send_queue.unfinished_tasks - removed, 0)
+            self.frame_send_queue.not_full.notify(removed)
+
+    def _keep_for_retry(self, frame: EvominSendFrame) -> bool:
+        """
+        Decide whether a frame stays queued after a transmission attempt.
+        Frames read from the spool are sent until they are acknowledged, they don't count against retry_count.
+        :return: True if the frame needs to be sent again
+        """
+        frame.attempts += 1
+        if not frame.is_sent and frame.spool_position is not None:
+            return True
+        if not frame.is_sent and frame.retries_left - 1 > 0:
+            frame.retries_left -= 1
+            return True
+        if not frame.is_sent:
+            self.log_error('Frame dropped as it could not be sent within the maximum retry count')
+        # Frame is already removed from the queue at this point
+        return False
+
+    def _receive_reply(self, frame: EvominSendFrame, segment_length: int) -> None:
+        """
+        Clock in the slave's reply segment by segment. After a full segment, the slave announces the length of the
+        next one (a length of 0 ends the reply).
+        """
+        offset: int = 0
+        while segment_length:
+            # Fill reply buffer
+            segment: bytearray = bytearray(segment_length)
+            received: int = 0
+            for _ in range(segment_length):
+                reply_byte: int = self.com_interface.send_byte(EvominFrameMessageType.DUMMY)
+                if reply_byte is not None and reply_byte in range(256):
+                    segment[received] = reply_byte
+                    received += 1
+            if received < segment_length:
+                del segment[received:]
+
+            next_segment_length: int = 0
+            if segment_length == EvominReplyBuffer.MAX_SEGMENT_SIZE:
+                next_segment_length = self.com_interface.send_byte(EvominFrameMessageType.DUMMY) or 0
+
+            if frame.command == EvominFrameCommandType.CAPABILITIES.value:
+                # The slave's answer to our capability announcement
+                self._capabilities_received(bytes(segment))
             else:
-                self.log_error('Frame dropped as it could not be sent within the maximum retry count')
-                # Frame is already removed from the queue at this point
+                # Inform user that we've got a reply
+                if self.profiler is None:
+                    self.reply_chunk_received(segment, offset, not next_segment_length)
+                else:
+                    self.profiler.run_callback('reply_chunk_received', self.reply_chunk_received, segment, offset,
+                                               not next_segment_length)
+            offset += len(segment)
+            segment_length = next_segment_length
+
+    def _build_frame(self, command: EvominFrameCommandType, payload: bytes) -> Optional[EvominSendFrame]:
+        """
+        :return: The frame to be enqueued, None if the payload exceeds the buffer size
+        """
+        # Check the uncompressed size, as the receiver can't decompress beyond its buffer size
+        if len(payload) > self.config.buffer_size:
+            self.log_error('Frame cannot be send, as the payload exceeds {} bytes'.format(self.config.buffer_size))
+            return None
+        command_value: int = command.value
+        if self.compressor is not None:
+            command_value, payload = self.compressor.compress(command_value, payload)
+        return EvominSendFrame(command_value, payload, self.config)
 
     def send(self, command: EvominFrameCommandType, payload: bytes) -> bool:
         """
@@ -431,6 +802,21 @@ class Evomin(ABC):
         :param payload:
         :return: Whether the frame could be enqueued or not
         """
-        frame: EvominSendFrame = EvominSendFrame(command.value, payload)
+        frame: Optional[EvominSendFrame] = self._build_frame(command, payload)
+        if frame is None:
+            return False
         # Queue Frame (sending won't happen directly, but is processed through a sending queue)
         return self._queue_frame(frame)
+
+    def send_many(self, frames: Iterable[Tuple[EvominFrameCommandType, bytes]]) -> bool:
+        """
+        Enqueue several frames atomically: either all of them are enqueued or none, i.e. if a payload exceeds the buffer
+        size, or if the queue lacks space and there is no spool or the spool is full.
+        In a non master-slave setup, all frames that are due are sent with a single write on the next poll().
+        :param frames: (command, payload) tuples
+        :return: Whether the frames could be enqueued or not
+        """
+        built: List[Optional[EvominSendFrame]] = [self._build_frame(command, payload) for command, payload in frames]
+        if any(frame is None for frame in built):
+            return False
+        return self._queue_frames(built)
@@ -3,4 +3,16 @@
 
 
 class EvominNotAByteException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class EvominBufferOverflowException(Exception):
+    pass
+
+
+class EvominCompressionException(Exception):
+    pass
+
+
+class EvominSpoolException(Exception):
+    pass
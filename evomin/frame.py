@@ -2,9 +2,9 @@
 # -*- coding: utf-8 -*
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Generator
-from evomin.buffer import EvominBuffer
-from evomin.config import config
+from typing import Optional, Generator, Tuple
+from evomin.buffer import EvominBuffer, EvominReplyBuffer
+from evomin.config import EvominConfig, DEFAULT_CONFIG
 
 
 class EvominFrameMessageType:
@@ -33,16 +33,20 @@ class EvominFrameCommandType(Enum):
     the command list for every new operation.
     RESERVED: Not used
     SEND_IDN: Used for defining a self identification frame
+    CAPABILITIES: Protocol internal, announces the supported payload compression codecs (handshake)
+    COMPRESSED: Protocol internal, wraps the original command and its compressed payload
     """
     RESERVED = 0x00
     SEND_IDN = 0xCD
+    CAPABILITIES = 0xCE
+    COMPRESSED = 0xCF
 
 
 class EvominFrame:
 
     IS_RECEIVED_FRAME = True
 
-    def __init__(self, command: int, payload: Optional[bytes] = None) -> None:
+    def __init__(self, command: int, payload: Optional[bytes] = None, config: EvominConfig = DEFAULT_CONFIG) -> None:
         """
         Initialize a new EvominFrame from received bytes.
         Every communication transaction consists of a EvominFrame, as it acts as a wrapper for the internal protocol
@@ -50,16 +54,17 @@ class EvominFrame:
         :param command: EvominFrameCommandType
         :param payload: Any number of bytes - for compatibility with the C API pay attention to the defined maximum
                         payload size
+        :param config: The configuration of the owning Evomin interface
         """
         self.is_sent: bool = False
         self.is_valid: bool = False
-        self.command: int = command if command in [c.value for c in EvominFrameCommandType] else EvominFrameCommandType.RESERVED
-        self.payload_buffer: EvominBuffer = EvominBuffer(payload)
-        self.answer_buffer: EvominBuffer = EvominBuffer()
+        self.command: int = command if command in [c.value for c in EvominFrameCommandType] else EvominFrameCommandType.RESERVED.value
+        self.payload_buffer: EvominBuffer = EvominBuffer(payload, config.buffer_size)
+        self.answer_buffer: EvominReplyBuffer = EvominReplyBuffer()
         self.expected_payload_len: int = len(payload) if payload else 0
         self.crc8: int = 0
         self.timestamp: datetime = datetime.now()
-        self.retries_left: int = config['frame']['retry_count']
+        self.retries_left: int = config.retry_count
         self.last_byte_was_stfbyt: bool = False
         self.last_byte: int = -1
         self.waiting_for_ack: bool = False
@@ -118,6 +123,24 @@ class EvominFrame:
     def payload_length(self, payload_len: int) -> None:
         self.expected_payload_len = payload_len
 
+    @staticmethod
+    def stuffed_length(payload: bytes) -> int:
+        """
+        Number of payload bytes on the wire, including the automatically inserted stuff bytes
+        """
+        found_pl_header: bool = False
+        last_byte: int = -1
+        stuff_bytes: int = 0
+        for b in payload:
+            if found_pl_header:
+                last_byte = EvominFrameMessageType.STFBYT
+                found_pl_header = False
+                stuff_bytes += 1
+            if b == EvominFrameMessageType.SOF and last_byte == EvominFrameMessageType.SOF:
+                found_pl_header = True
+            last_byte = b
+        return len(payload) + stuff_bytes
+
     @staticmethod
     def calculate_crc8(stripped_payload: bytes) -> int:
         crc_initial: int = 0x00
@@ -137,6 +160,44 @@ class EvominSendFrame(EvominFrame):
     """
     IS_RECEIVED_FRAME = False
 
-    def __init__(self, command: int, payload: bytes) -> None:
-        super().__init__(command, payload)
-        self.previous_timestamp: datetime = datetime.now()
+    def __init__(self, command: int, payload: bytes, config: EvominConfig = DEFAULT_CONFIG) -> None:
+        super().__init__(command, payload, config)
+        # Time of the last transmission attempt (or when the frame was queued) on the clock of the Evomin interface
+        self.previous_timestamp: float = 0.0
+        self.encoded: Optional[bytes] = None
+        # Number of finished (acknowledged or failed) transmission attempts so far
+        self.attempts: int = 0
+        # Position of the frame's record in the spool, if it has been read from one
+        self.spool_position: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def from_encoded(cls, encoded: bytes, config: EvominConfig = DEFAULT_CONFIG) -> 'EvominSendFrame':
+        """
+        Rebuild a frame from its on-wire representation (refer to encode()), i.e. when it is read back from a spool
+        """
+        payload: bytearray = bytearray()
+        last_byte: int = -1
+        skip_stuff_byte: bool = False
+        for b in encoded[5:-1]:
+            if skip_stuff_byte:
+                skip_stuff_byte = False
+                last_byte = EvominFrameMessageType.STFBYT
+                continue
+            if b == EvominFrameMessageType.SOF and last_byte == EvominFrameMessageType.SOF:
+                skip_stuff_byte = True
+            last_byte = b
+            payload.append(b)
+        frame: EvominSendFrame = cls(encoded[3], bytes(payload), config)
+        frame.encoded = bytes(encoded)
+        return frame
+
+    def encode(self) -> bytes:
+        """
+        On-wire representation of the frame from the SOF bytes up to the CRC, including the inserted stuff bytes.
+        Sent frames don't change, so the encoding is only calculated once and reused for every retry.
+        """
+        if self.encoded is None:
+            self.encoded = bytes([EvominFrameMessageType.SOF, EvominFrameMessageType.SOF, EvominFrameMessageType.SOF,
+                                  self.command, self.payload_length]) \
+                + bytes(self.payload_buffer.buffer.queue) + bytes([self.crc8])
+        return self.encoded
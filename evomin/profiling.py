@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from enum import Enum
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+
+class EvominSendPhase(Enum):
+    """
+    EvominSendPhase defines the measured phases of sending a frame.
+    ENCODE: Building the on-wire representation (header, stuffed payload, CRC), cached after the first attempt
+    WRITE: Writing header, payload and CRC to the communication interface (a single send_bytes() call)
+    ACK_WAIT: Clocking out the first EOF and receiving the slave's ACK / NACK (master-slave only)
+    REPLY: Reply length, the slave's reply and the closing ACK / NACK (master-slave only)
+    """
+    ENCODE = 0
+    WRITE = 1
+    ACK_WAIT = 2
+    REPLY = 3
+
+
+class EvominTiming:
+    """Cumulative time and number of calls of a single measured section"""
+    __slots__ = ('calls', 'total')
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.total: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+    def __repr__(self) -> str:
+        return 'EvominTiming(calls={c}, total={t:.6f}s)'.format(c=self.calls, t=self.total)
+
+
+class EvominProfiler:
+    """
+    Opt-in profiling of evomin's hot paths, enabled by passing an instance to Evomin(.., profiler=..).
+    Collects the time and number of calls per state of the internal state machine, per phase of sending a frame
+    (refer to EvominSendPhase) and per user callback (frame_received, reply_chunk_received / reply_received).
+    Time spent in user callbacks is excluded from the state and send phase timings, so protocol time and application
+    time are reported separately.
+    """
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        """
+        :param clock: High resolution time source in seconds
+        """
+        self.clock: Callable[[], float] = clock
+        self.states: Dict[str, EvominTiming] = {}
+        self.send_phases: Dict[EvominSendPhase, EvominTiming] = {}
+        self.callbacks: Dict[str, EvominTiming] = {}
+        # Running total of the callback time, used to exclude callbacks from the enclosing protocol sections
+        self.callback_time: float = 0.0
+
+    def reset(self) -> None:
+        self.states.clear()
+        self.send_phases.clear()
+        self.callbacks.clear()
+        self.callback_time = 0.0
+
+    def mark(self) -> Tuple[float, float]:
+        """
+        Start measuring a protocol section
+        :return: Token to be passed to elapsed(..)
+        """
+        return self.clock(), self.callback_time
+
+    def elapsed(self, token: Tuple[float, float]) -> float:
+        """
+        :return: Time since mark() in seconds, excluding the time spent in user callbacks meanwhile
+        """
+        return self.clock() - token[0] - (self.callback_time - token[1])
+
+    def add_state(self, name: str, elapsed: float) -> None:
+        timing: Optional[EvominTiming] = self.states.get(name)
+        if timing is None:
+            timing = self.states[name] = EvominTiming()
+        timing.calls += 1
+        timing.total += elapsed
+
+    def lap(self, phase: EvominSendPhase, token: Tuple[float, float]) -> Tuple[float, float]:
+        """
+        Record the time since the token as the given send phase
+        :return: A new token for the next phase
+        """
+        timing: Optional[EvominTiming] = self.send_phases.get(phase)
+        if timing is None:
+            timing = self.send_phases[phase] = EvominTiming()
+        timing.calls += 1
+        timing.total += self.elapsed(token)
+        return self.mark()
+
+    def run_callback(self, name: str, callback: Callable[..., Any], *args) -> Any:
+        """Call a user callback and record its time"""
+        start: float = self.clock()
+        try:
+            return callback(*args)
+        finally:
+            elapsed: float = self.clock() - start
+            timing: Optional[EvominTiming] = self.callbacks.get(name)
+            if timing is None:
+                timing = self.callbacks[name] = EvominTiming()
+            timing.calls += 1
+            timing.total += elapsed
+            self.callback_time += elapsed
+
+    @property
+    def protocol_time(self) -> float:
+        """Time spent in evomin itself (state machine and sending), excluding user callbacks"""
+        return sum(t.total for t in self.states.values()) + sum(t.total for t in self.send_phases.values())
+
+    def report(self) -> str:
+        lines: List[str] = ['{:<28}{:>10}{:>14}{:>14}'.format('Section', 'calls', 'total [ms]', 'mean [us]')]
+
+        def add(title: str, timings: Dict[str, EvominTiming]) -> None:
+            lines.append(title)
+            for name, timing in sorted(timings.items(), key=lambda item: -item[1].total):
+                lines.append('  {:<26}{:>10}{:>14.3f}{:>14.3f}'.format(name, timing.calls, timing.total * 1e3,
+                                                                      timing.mean * 1e6))
+
+        add('States', self.states)
+        add('Send phases', {p.name: t for p, t in self.send_phases.items()})
+        add('Callbacks', self.callbacks)
+        lines.append('Protocol time: {p:.3f} ms, callback time: {c:.3f} ms'.format(p=self.protocol_time * 1e3,
+                                                                                  c=self.callback_time * 1e3))
+        return '\n'.join(lines)
+
+
+class _EvominStackSampler(threading.Thread):
+    """Samples the call stack of a thread in fixed intervals"""
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name='evomin-stack-sampler', daemon=True)
+        self.thread_id: int = thread_id
+        self.interval: float = interval
+        self.samples: Counter = Counter()
+        self.stopped: threading.Event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{f} ({m}:{l})'.format(f=code.co_name, m=os.path.basename(code.co_filename),
+                                                    l=code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write('{s} {c}\n'.format(s=stack, c=count))
+
+
+@contextmanager
+def profile(pstats_file: Optional[str] = None, collapsed_file: Optional[str] = None,
+            sample_interval: float = 0.001) -> Generator[Optional[cProfile.Profile], None, None]:
+    """
+    Profile the code run within the context on the current thread, i.e. a loop calling evomin.poll():
+
+        with profile(pstats_file='evomin.pstats', collapsed_file='evomin.collapsed'):
+            ...
+
+    :param pstats_file: Export the cProfile statistics (python -m pstats, snakeviz, ..)
+    :param collapsed_file: Export sampled call stacks in the collapsed format ('a;b;c count') of flamegraph.pl,
+                           speedscope and inferno
+    :param sample_interval: Time between two stack samples in seconds
+    :return: The cProfile.Profile instance, if pstats_file is given
+    """
+    profiler: Optional[cProfile.Profile] = cProfile.Profile() if pstats_file else None
+    sampler: Optional[_EvominStackSampler] = None
+    if collapsed_file:
+        sampler = _EvominStackSampler(threading.get_ident(), sample_interval)
+        sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield profiler
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(pstats_file)
+        if sampler is not None:
+            sampler.stopped.set()
+            sampler.join()
+            sampler.write(collapsed_file)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+"""
+Simulation harness to measure goodput, retries and delivery latency of evomin over a lossy channel.
+Two evomin instances are connected through the fake transports of com_fake.py, wrapped by an EvominLossyInterface and
+driven by a simulated clock, so runs are fast and reproducible for a given seed.
+
+Example:
+    python -m evomin.simulation --ber 1e-4 --retry-count 3 5 --resend-min-time 0.05 0.2
+"""
+import argparse
+import itertools
+from typing import Dict, List, Optional
+from evomin.com_fake import EvominFakeSPIBus, EvominFakeUARTInterface
+from evomin.com_lossy import EvominChannelModel, EvominChannelStats, EvominLossyInterface, EvominSimClock
+from evomin.config import EvominConfig
+from evomin.evomin import Evomin
+from evomin.frame import EvominFrame, EvominFrameCommandType, EvominSendFrame
+
+
+class EvominSimulationReport:
+    """Result of a single simulation run"""
+    def __init__(self, master_slave: bool, frames: int, payload_size: int, config: EvominConfig) -> None:
+        self.master_slave: bool = master_slave
+        self.frames: int = frames
+        self.payload_size: int = payload_size
+        self.config: EvominConfig = config
+        self.delivered: int = 0
+        self.duplicates: int = 0
+        self.corrupted: int = 0
+        self.attempts: int = 0
+        self.duration: float = 0.0
+        self.latencies: List[float] = []
+        self.forward_channel: Optional[EvominChannelStats] = None
+        self.backward_channel: Optional[EvominChannelStats] = None
+
+    @property
+    def lost(self) -> int:
+        return self.frames - self.delivered
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - self.frames, 0)
+
+    @property
+    def goodput(self) -> float:
+        """Unique, valid payload bytes delivered per second"""
+        return self.delivered * self.payload_size / self.duration if self.duration else 0.0
+
+    def latency_percentile(self, percentile: float) -> float:
+        """Delivery latency (send() -> frame_received()) in seconds, nearest-rank percentile"""
+        if not self.latencies:
+            return float('nan')
+        ordered: List[float] = sorted(self.latencies)
+        rank: int = max(int(round(percentile / 100.0 * len(ordered) + 0.5)) - 1, 0)
+        return ordered[min(rank, len(ordered) - 1)]
+
+    def __str__(self) -> str:
+        return '{mode:<12} retry_count={rc:<2} resend_min_time={rt:<6} coalesce={mc:<2} delivered={d}/{f} lost={l} dup={u} ' \
+               'corrupt={c} retries={r} goodput={g:.1f} B/s latency p50={p50:.4f}s p90={p90:.4f}s ' \
+               'p99={p99:.4f}s'.format(mode='master-slave' if self.master_slave else 'uart',
+                                       rc=self.config.retry_count, rt=self.config.resend_min_time,
+                                       mc=self.config.max_coalesced_frames,
+                                       d=self.delivered, f=self.frames, l=self.lost, u=self.duplicates,
+                                       c=self.corrupted, r=self.retries, g=self.goodput,
+                                       p50=self.latency_percentile(50), p90=self.latency_percentile(90),
+                                       p99=self.latency_percentile(99))
+
+
+class _SimulatedEvomin(Evomin):
+    """Evomin participant that records deliveries and transmission attempts"""
+    def __init__(self, *args, payload_size: int = 0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.payload_size: int = payload_size
+        self.attempts: int = 0
+        self.delivered_at: Dict[int, float] = {}
+        self.duplicates: int = 0
+        self.corrupted: int = 0
+
+    def frame_received(self, frame: EvominFrame) -> None:
+        payload: bytes = bytes(frame.get_payload())
+        sequence: int = int.from_bytes(payload[:2], 'big')
+        if len(payload) != self.payload_size or payload != _payload(sequence, self.payload_size):
+            # Only possible in a master-slave setup, where frame_received(..) is called before the CRC check
+            self.corrupted += 1
+        elif sequence in self.delivered_at:
+            self.duplicates += 1
+        else:
+            self.delivered_at[sequence] = self.clock()
+
+    def reply_received(self, reply_payload: bytes) -> None:
+        pass
+
+    def _send_lowlevel(self, frame: EvominSendFrame) -> None:
+        if frame.retries_left:
+            self.attempts += 1
+        super()._send_lowlevel(frame)
+
+    def _send_lowlevel_many(self, frames: List[EvominSendFrame]) -> None:
+        self.attempts += len(frames)
+        super()._send_lowlevel_many(frames)
+
+
+def _payload(sequence: int, payload_size: int) -> bytes:
+    # The filler depends on a checksum of the sequence number, so corrupted sequence numbers can be detected
+    header: bytes = sequence.to_bytes(2, 'big')
+    check: int = EvominFrame.calculate_crc8(header)
+    return header + bytes((check + i) & 0x7F for i in range(payload_size - 2))
+
+
+def run_simulation(model: EvominChannelModel, reverse_model: Optional[EvominChannelModel] = None,
+                   master_slave: bool = False, frames: int = 100, payload_size: int = 16,
+                   config: Optional[EvominConfig] = None, seed: Optional[int] = 0,
+                   poll_interval: float = 1e-4, timeout: float = 3600.0) -> EvominSimulationReport:
+    """
+    Send a number of frames from one participant to the other over a simulated lossy channel.
+    :param model: Channel model from the sender to the receiver (and back, in a master-slave setup)
+    :param reverse_model: Channel model from the receiver back to the sender (non master-slave only),
+                          defaults to model
+    :param master_slave: Simulate a master-slave (SPI) setup instead of UART
+    :param frames: Number of frames to send, the producer keeps the send queue filled
+    :param payload_size: Payload bytes per frame (at least 2, the first two carry a sequence number)
+    :param config: Configuration of both participants, i.e. to tune retry_count and resend_min_time
+    :param seed: Seed of the channel models
+    :param poll_interval: Simulated time between two poll() calls while bytes are on the line
+    :param timeout: Maximum simulated time in seconds
+    """
+    config = config if config is not None else EvominConfig(use_logging=False)
+    clock: EvominSimClock = EvominSimClock()
+    report: EvominSimulationReport = EvominSimulationReport(master_slave, frames, payload_size, config)
+
+    links: List[EvominLossyInterface] = []
+    if master_slave:
+        bus: EvominFakeSPIBus = EvominFakeSPIBus()
+        links.append(EvominLossyInterface(bus, model, seed, clock))
+        sender: _SimulatedEvomin = _SimulatedEvomin(links[0], config, clock=clock)
+        receiver: _SimulatedEvomin = _SimulatedEvomin(bus.slave_interface, config, clock=clock,
+                                                      payload_size=payload_size)
+        bus.attach(receiver)
+        participants: List[_SimulatedEvomin] = [sender]
+    else:
+        end_a, end_b = EvominFakeUARTInterface.pair()
+        links.append(EvominLossyInterface(end_a, model, seed, clock))
+        links.append(EvominLossyInterface(end_b, reverse_model or model, None if seed is None else seed + 1, clock))
+        sender = _SimulatedEvomin(links[0], config, clock=clock)
+        receiver = _SimulatedEvomin(links[1], config, clock=clock, payload_size=payload_size)
+        participants = [sender, receiver]
+
+    sent_at: Dict[int, float] = {}
+    while clock.now < timeout:
+        while len(sent_at) < frames and not sender.frame_send_queue.full():
+            sequence: int = len(sent_at)
+            sender.send(EvominFrameCommandType.SEND_IDN, _payload(sequence, payload_size))
+            sent_at[sequence] = clock.now
+
+        for participant in participants:
+            participant.poll()
+
+        if _line_busy(links, participants):
+            clock.advance(poll_interval)
+            continue
+
+        # Nothing on the line, skip ahead to the next (re)transmission
+        due: List[float] = [p.frame_send_queue.queue[0].previous_timestamp + config.resend_min_time
+                            for p in participants if not p.frame_send_queue.empty()]
+        if not due:
+            if len(sent_at) == frames:
+                break
+            clock.advance(poll_interval)
+        else:
+            clock.now = max(clock.now + poll_interval, min(due))
+
+    report.duration = max(receiver.delivered_at.values(), default=clock.now)
+    # Sequence numbers that have never been sent can only stem from undetected corruption
+    unknown: List[int] = [s for s in receiver.delivered_at if s not in sent_at]
+    for sequence in unknown:
+        del receiver.delivered_at[sequence]
+    report.delivered = len(receiver.delivered_at)
+    report.duplicates = receiver.duplicates
+    report.corrupted = receiver.corrupted + len(unknown)
+    report.attempts = sender.attempts
+    report.latencies = [t - sent_at[s] for s, t in receiver.delivered_at.items()]
+    report.forward_channel = links[0].stats
+    report.backward_channel = links[1].stats if len(links) > 1 else None
+    return report
+
+
+def _line_busy(links: List[EvominLossyInterface], participants: List[_SimulatedEvomin]) -> bool:
+    if any(link.in_flight for link in links):
+        return True
+    for participant in participants:
+        interface = participant.com_interface
+        if isinstance(interface, EvominLossyInterface):
+            interface = interface.com_interface
+        if isinstance(interface, EvominFakeUARTInterface) and interface.rx:
+            return True
+    return False
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Measure evomin goodput, retries and latency over a lossy channel')
+    parser.add_argument('--master-slave', action='store_true', help='simulate a master-slave (SPI) setup')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--payload-size', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ber', type=float, default=0.0, help='bit error rate')
+    parser.add_argument('--drop', type=float, default=0.0, help='byte drop probability')
+    parser.add_argument('--duplicate', type=float, default=0.0, help='byte duplication probability')
+    parser.add_argument('--burst-rate', type=float, default=0.0, help='probability of a burst error per byte')
+    parser.add_argument('--burst-length', type=float, default=8.0, help='mean burst length in bytes')
+    parser.add_argument('--latency', type=float, default=0.0, help='propagation delay in seconds')
+    parser.add_argument('--bandwidth', type=float, default=11520.0, help='bytes per second, 0 for unlimited')
+    parser.add_argument('--retry-count', type=int, nargs='+', default=[3])
+    parser.add_argument('--resend-min-time', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--max-coalesced-frames', type=int, nargs='+', default=[1])
+    args = parser.parse_args(argv)
+
+    model: EvominChannelModel = EvominChannelModel(bit_error_rate=args.ber, drop_rate=args.drop,
+                                                   duplicate_rate=args.duplicate, burst_rate=args.burst_rate,
+                                                   burst_length=args.burst_length, latency=args.latency,
+                                                   bandwidth=args.bandwidth or None)
+    for retry_count, resend_min_time, max_coalesced_frames in itertools.product(args.retry_count,
+                                                                                args.resend_min_time,
+                                                                                args.max_coalesced_frames):
+        config: EvominConfig = EvominConfig(retry_count=retry_count, resend_min_time=resend_min_time,
+                                            max_coalesced_frames=max_coalesced_frames, use_logging=False)
+        print(run_simulation(model, master_slave=args.master_slave, frames=args.frames,
+                             payload_size=args.payload_size, config=config, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import mmap
+import os
+import re
+import zlib
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+from evomin.exceptions import EvominSpoolException
+
+# Magic and format version at the start of every segment file
+SEGMENT_MAGIC: bytes = b'EVSPOOL\x01'
+SEGMENT_FILE_PATTERN: str = r'^segment-(\d{8})\.spool$'
+# Record header: state, data length (2 bytes, big endian), CRC32 of the data (4 bytes, big endian)
+RECORD_HEADER_SIZE: int = 7
+# Largest encoded frame: 3x SOF, command, length, a stuffed payload of 255 bytes and the CRC
+MAX_RECORD_SIZE: int = RECORD_HEADER_SIZE + 6 + 255 + 127
+
+# Record states, the state byte is written last so a torn record is never mistaken for a valid one
+RECORD_FREE: int = 0x00
+RECORD_PENDING: int = 0x01
+RECORD_CONSUMED: int = 0x02
+
+
+class _EvominSpoolSegment:
+    """
+    A single append-only segment file. The file is only memory-mapped while it is in use, so the number of open
+    mappings stays constant no matter how many segments are queued up.
+    """
+    def __init__(self, path: str, index: int) -> None:
+        self.path: str = path
+        self.index: int = index
+        self.map: Optional[mmap.mmap] = None
+        self.size: int = 0
+        # Next record that hasn't been read yet
+        self.read_offset: int = len(SEGMENT_MAGIC)
+        self.write_offset: int = len(SEGMENT_MAGIC)
+        # Records that have been read, but not consumed yet
+        self.in_flight: int = 0
+        self.unread: int = 0
+
+    @property
+    def unconsumed(self) -> int:
+        return self.unread + self.in_flight
+
+    def create(self, size: int) -> None:
+        fd: int = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL)
+        try:
+            # Sparse file, only the pages actually written to occupy disk space
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.size = size
+        self.map[:len(SEGMENT_MAGIC)] = SEGMENT_MAGIC
+
+    def open(self) -> None:
+        """Map the segment file (again), the offsets are kept while it is closed"""
+        if self.map is not None:
+            return
+        fd: int = os.open(self.path, os.O_RDWR)
+        try:
+            self.size = os.fstat(fd).st_size
+            if self.size < len(SEGMENT_MAGIC):
+                raise EvominSpoolException('Spool segment {} is truncated'.format(self.path))
+            self.map = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        if self.map[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            self.close()
+            raise EvominSpoolException('{} is not a spool segment'.format(self.path))
+
+    def recover(self) -> None:
+        """
+        Recover the offsets from the records of an existing segment file. Records that have been read, but not
+        consumed before a restart, are read again
+        """
+        self.open()
+        m: mmap.mmap = self.map
+        offset: int = len(SEGMENT_MAGIC)
+        first_pending: Optional[int] = None
+        self.unread = 0
+        self.in_flight = 0
+        while offset + RECORD_HEADER_SIZE <= self.size and m[offset] != RECORD_FREE:
+            length: int = int.from_bytes(m[offset + 1:offset + 3], 'big')
+            end: int = offset + RECORD_HEADER_SIZE + length
+            if end > self.size or zlib.crc32(m[offset + RECORD_HEADER_SIZE:end]) != \
+                    int.from_bytes(m[offset + 3:offset + 7], 'big'):
+                # Torn write (i.e. power loss while appending), everything from here on is discarded
+                m[offset:] = bytes(self.size - offset)
+                break
+            if m[offset] == RECORD_PENDING:
+                self.unread += 1
+                if first_pending is None:
+                    first_pending = offset
+            offset = end
+        self.write_offset = offset
+        self.read_offset = first_pending if first_pending is not None else offset
+
+    def append(self, data: bytes) -> bool:
+        """
+        :return: False if the record doesn't fit into this segment anymore
+        """
+        offset: int = self.write_offset
+        end: int = offset + RECORD_HEADER_SIZE + len(data)
+        if end > self.size:
+            return False
+        m: mmap.mmap = self.map
+        m[offset + 1:offset + 3] = len(data).to_bytes(2, 'big')
+        m[offset + 3:offset + 7] = zlib.crc32(data).to_bytes(4, 'big')
+        m[offset + RECORD_HEADER_SIZE:end] = data
+        m[offset] = RECORD_PENDING
+        self.write_offset = end
+        self.unread += 1
+        return True
+
+    def read(self) -> Tuple[int, bytes]:
+        """
+        Read the next unread record, it stays pending until consume(..) is called
+        :return: Offset and data of the record
+        """
+        m: mmap.mmap = self.map
+        while True:
+            offset: int = self.read_offset
+            end: int = offset + RECORD_HEADER_SIZE + int.from_bytes(m[offset + 1:offset + 3], 'big')
+            self.read_offset = end
+            # Records consumed before a restart are skipped
+            if m[offset] == RECORD_PENDING:
+                self.unread -= 1
+                self.in_flight += 1
+                return offset, m[offset + RECORD_HEADER_SIZE:end]
+
+    def consume(self, offset: int) -> None:
+        self.map[offset] = RECORD_CONSUMED
+        self.in_flight -= 1
+
+    def rewind(self) -> None:
+        """Reuse a fully consumed segment from the start, instead of creating a new file"""
+        self.map[len(SEGMENT_MAGIC):self.write_offset] = bytes(self.write_offset - len(SEGMENT_MAGIC))
+        self.read_offset = self.write_offset = len(SEGMENT_MAGIC)
+
+    def flush(self) -> None:
+        if self.map is not None:
+            self.map.flush()
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class EvominSpool:
+    """
+    Disk-backed overflow of the send queue for a peer that is offline for a longer time.
+    Encoded frames are appended to memory-mapped segment files in a directory and read back in order, so memory use
+    stays flat regardless of the backlog. A record is read when its frame moves into the send queue, but it is only
+    marked consumed once the frame has been acknowledged, so every frame that hasn't been acknowledged before a restart
+    of the process is read (and sent) again. Fully consumed segment files are deleted (or, if it is the last one,
+    reused).
+    Writes end up in the page cache of the operating system: they survive a crash of the process, use
+    sync_writes=True (or call flush()) to survive a power loss as well.
+    The spool is not thread-safe on its own, Evomin only accesses it while holding the send queue's lock.
+    """
+    def __init__(self, directory: str, segment_size: int = 64 * 1024, max_segments: Optional[int] = None,
+                 sync_writes: bool = False) -> None:
+        """
+        :param directory: Directory of the segment files, created if missing. Use one directory per Evomin instance
+        :param segment_size: Size of a single segment file in bytes
+        :param max_segments: Maximum number of segment files, None for no limit
+        :param sync_writes: Flush every appended and consumed record to disk
+        """
+        if segment_size < len(SEGMENT_MAGIC) + MAX_RECORD_SIZE:
+            raise EvominSpoolException('Segment size must be at least {} bytes'.format(
+                len(SEGMENT_MAGIC) + MAX_RECORD_SIZE))
+        self.directory: str = directory
+        self.segment_size: int = segment_size
+        self.max_segments: Optional[int] = max_segments
+        self.sync_writes: bool = sync_writes
+        self.segments: Deque[_EvominSpoolSegment] = deque()
+        # Records that haven't been read yet
+        self.unread: int = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def __len__(self) -> int:
+        return self.unread
+
+    def _recover(self) -> None:
+        indices: List[int] = sorted(int(m.group(1)) for m in
+                                    (re.match(SEGMENT_FILE_PATTERN, name) for name in os.listdir(self.directory)) if m)
+        for index in indices:
+            segment: _EvominSpoolSegment = _EvominSpoolSegment(self._segment_path(index), index)
+            segment.recover()
+            if not segment.unread:
+                segment.close()
+                os.remove(segment.path)
+                continue
+            self.unread += segment.unread
+            self.segments.append(segment)
+        # Only the segment read from and the one written to stay mapped
+        for segment in list(self.segments)[1:-1]:
+            segment.close()
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, 'segment-{:08d}.spool'.format(index))
+
+    def _read_segment(self) -> Optional[_EvominSpoolSegment]:
+        for segment in self.segments:
+            if segment.unread:
+                return segment
+        return None
+
+    def _release(self, segment: _EvominSpoolSegment) -> None:
+        """Unmap a segment that is neither read from, written to nor waiting for records to be consumed anymore"""
+        if segment is not self.segments[-1] and segment is not self._read_segment() and not segment.in_flight:
+            segment.close()
+
+    def _add_segment(self) -> _EvominSpoolSegment:
+        index: int = self.segments[-1].index + 1 if self.segments else 0
+        segment: _EvominSpoolSegment = _EvominSpoolSegment(self._segment_path(index), index)
+        segment.create(self.segment_size)
+        self.segments.append(segment)
+        if len(self.segments) > 1:
+            self._release(self.segments[-2])
+        return segment
+
+    def _fits(self, records: List[bytes]) -> bool:
+        if self.max_segments is None:
+            return True
+        segments: int = len(self.segments)
+        offset: int = self.segments[-1].write_offset if self.segments else 0
+        size: int = self.segments[-1].size if self.segments else 0
+        for data in records:
+            end: int = offset + RECORD_HEADER_SIZE + len(data)
+            if end > size:
+                segments += 1
+                size = self.segment_size
+                end = len(SEGMENT_MAGIC) + RECORD_HEADER_SIZE + len(data)
+            offset = end
+        return segments <= self.max_segments
+
+    def push(self, data: bytes) -> bool:
+        """
+        Append a record to the spool
+        :param data: Up to 65535 bytes, i.e. an encoded frame
+        :return: Whether the record could be spooled (False if max_segments is reached)
+        """
+        return self.push_many([data])
+
+    def push_many(self, records: List[bytes]) -> bool:
+        """
+        Append several records, either all of them or none
+        :return: Whether the records could be spooled (False if max_segments is reached)
+        """
+        for data in records:
+            if RECORD_HEADER_SIZE + len(data) > self.segment_size - len(SEGMENT_MAGIC) or len(data) > 0xFFFF:
+                raise EvominSpoolException('Record of {} bytes exceeds the segment size'.format(len(data)))
+        if not self._fits(records):
+            return False
+        # Whether this call has written to the current last segment
+        written: bool = False
+        for data in records:
+            if self.segments and self.segments[-1].append(data):
+                written = True
+            else:
+                if self.sync_writes and written:
+                    # Flush before _add_segment() possibly unmaps it
+                    self.segments[-1].flush()
+                self._add_segment().append(data)
+                written = True
+            self.unread += 1
+        if self.sync_writes:
+            self.segments[-1].flush()
+        return True
+
+    def read(self) -> Optional[Tuple[Tuple[int, int], bytes]]:
+        """
+        Read the oldest unread record. It stays in the spool until it is consumed
+        :return: The record's position (to be passed to consume(..)) and its data, None if there's no unread record
+        """
+        segment: Optional[_EvominSpoolSegment] = self._read_segment()
+        if segment is None:
+            return None
+        segment.open()
+        offset, data = segment.read()
+        self.unread -= 1
+        if not segment.unread:
+            self._release(segment)
+        return (segment.index, offset), data
+
+    def consume(self, position: Tuple[int, int]) -> None:
+        """
+        Remove a read record from the spool for good, i.e. once its frame has been acknowledged
+        :param position: Position of the record as returned by read()
+        """
+        index, offset = position
+        segment: Optional[_EvominSpoolSegment] = next((s for s in self.segments if s.index == index), None)
+        if segment is None:
+            return
+        segment.open()
+        segment.consume(offset)
+        if self.sync_writes:
+            segment.flush()
+        if segment.unconsumed:
+            self._release(segment)
+        elif segment is not self.segments[-1]:
+            # Compaction: the whole segment has been consumed
+            segment.close()
+            os.remove(segment.path)
+            self.segments.remove(segment)
+        else:
+            segment.rewind()
+
+    def flush(self) -> None:
+        """Write all changes to disk"""
+        for segment in self.segments:
+            segment.flush()
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments.clear()
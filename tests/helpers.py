@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from typing import List
+from evomin.com_lossy import EvominSimClock
+from evomin.evomin import Evomin
+from evomin.frame import EvominFrame
+
+
+class RecordingEvomin(Evomin):
+    """Evomin instance keeping the payloads of all received frames and replies, and all logged errors"""
+    def __init__(self, *args, **kwargs) -> None:
+        self.errors: List[str] = []
+        super().__init__(*args, **kwargs)
+        self.received: List[bytes] = []
+        self.replies: List[bytes] = []
+
+    def log_error(self, message: str) -> None:
+        self.errors.append(message)
+        super().log_error(message)
+
+    def frame_received(self, frame: EvominFrame) -> None:
+        self.received.append(bytes(frame.get_payload()))
+
+    def reply_received(self, reply_payload: bytes) -> None:
+        self.replies.append(bytes(reply_payload))
+
+
+class EvominLinkTestCase(unittest.TestCase):
+    """Runs two Evomin instances against a simulated clock"""
+    def setUp(self) -> None:
+        self.clock: EvominSimClock = EvominSimClock()
+
+    def run_link(self, sender: Evomin, receiver: Evomin, seconds: float, step: float = 0.001,
+                 receiver_polls: int = 100, sender_polls: int = 10) -> None:
+        """
+        Poll both ends, advancing the clock by step after each round
+        :param receiver_polls: Polls of the receiver per round, each processing a single received byte
+        :param sender_polls: Polls of the sender per round after the receiver's ones, to pick up the ACKs
+        """
+        for _ in range(int(seconds / step)):
+            sender.poll()
+            for _ in range(receiver_polls):
+                receiver.poll()
+            for _ in range(sender_polls):
+                sender.poll()
+            self.clock.advance(step)
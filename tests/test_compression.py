@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+import zlib
+from typing import Optional
+from evomin.com_fake import EvominFakeSPIBus, EvominFakeUARTInterface
+from evomin.compression import EvominCompressionCodec, EvominCompressor
+from evomin.config import EvominConfig
+from evomin.frame import EvominFrameCommandType
+from helpers import EvominLinkTestCase, RecordingEvomin
+
+DICTIONARY: bytes = b'temperature humidity pressure evomin '
+# Compressible by all codecs, within the default buffer size
+PAYLOAD: bytes = b'evomin ' * 7
+
+
+def create_compressor(codec: EvominCompressionCodec = EvominCompressionCodec.ZLIB, **kwargs) -> EvominCompressor:
+    return EvominCompressor([EvominFrameCommandType.SEND_IDN], [codec], dictionary=DICTIONARY, **kwargs)
+
+
+class EvominCompressionTest(EvominLinkTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0.1)
+
+    def connect_uart(self, sender_compressor: Optional[EvominCompressor],
+                     receiver_compressor: Optional[EvominCompressor]) -> None:
+        sender_interface, receiver_interface = EvominFakeUARTInterface.pair()
+        self.sender: RecordingEvomin = RecordingEvomin(sender_interface, self.config, compressor=sender_compressor,
+                                                       clock=self.clock)
+        self.receiver: RecordingEvomin = RecordingEvomin(receiver_interface, self.config,
+                                                         compressor=receiver_compressor, clock=self.clock)
+
+    def negotiate_uart(self, sender_compressor: Optional[EvominCompressor] = None,
+                       receiver_compressor: Optional[EvominCompressor] = None) -> None:
+        self.connect_uart(sender_compressor or create_compressor(), receiver_compressor or create_compressor())
+        self.assertTrue(self.sender.negotiate_compression())
+        # Both directions of the handshake need a poll on either end
+        self.run_link(self.sender, self.receiver, 0.2)
+        self.run_link(self.receiver, self.sender, 0.2)
+
+    def transfer(self, command: EvominFrameCommandType, payload: bytes) -> None:
+        self.assertTrue(self.sender.send(command, payload))
+        self.run_link(self.sender, self.receiver, 0.3)
+        self.assertTrue(self.sender.frame_send_queue.empty())
+
+    def test_uart_negotiation(self):
+        self.negotiate_uart()
+        self.assertIs(self.sender.compressor.codec, EvominCompressionCodec.ZLIB)
+        self.assertIs(self.receiver.compressor.codec, EvominCompressionCodec.ZLIB)
+        # The handshake is protocol internal
+        self.assertEqual(self.sender.received + self.receiver.received, [])
+
+    def test_master_slave_negotiation(self):
+        config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0)
+        bus: EvominFakeSPIBus = EvominFakeSPIBus()
+        master: RecordingEvomin = RecordingEvomin(bus, config, compressor=create_compressor(), clock=self.clock)
+        slave: RecordingEvomin = RecordingEvomin(bus.slave_interface, config, compressor=create_compressor(),
+                                                 clock=self.clock)
+        bus.attach(slave)
+        self.assertTrue(master.negotiate_compression())
+        master.poll()
+        self.assertIs(master.compressor.codec, EvominCompressionCodec.ZLIB)
+        self.assertIs(slave.compressor.codec, EvominCompressionCodec.ZLIB)
+        self.assertEqual(master.replies, [])
+
+        self.assertTrue(master.send(EvominFrameCommandType.SEND_IDN, PAYLOAD))
+        master.poll()
+        self.assertEqual(slave.received, [PAYLOAD])
+        self.assertEqual(master.compressor.stats.frames_compressed, 1)
+
+    def test_round_trip_per_codec(self):
+        for codec in (EvominCompressionCodec.ZLIB, EvominCompressionCodec.LZMA, EvominCompressionCodec.ZLIB_DICT):
+            with self.subTest(codec=codec):
+                self.negotiate_uart(create_compressor(codec), create_compressor(codec))
+                self.assertIs(self.sender.compressor.codec, codec)
+                self.transfer(EvominFrameCommandType.SEND_IDN, PAYLOAD)
+                self.assertEqual(self.receiver.received, [PAYLOAD])
+                self.assertEqual(self.sender.compressor.stats.frames_compressed, 1)
+                self.assertEqual(self.receiver.compressor.stats.frames_decompressed, 1)
+
+    def test_dictionary_mismatch_falls_back_to_other_codec(self):
+        codecs = (EvominCompressionCodec.ZLIB_DICT, EvominCompressionCodec.ZLIB)
+        self.negotiate_uart(EvominCompressor([EvominFrameCommandType.SEND_IDN], codecs, dictionary=DICTIONARY),
+                            EvominCompressor([EvominFrameCommandType.SEND_IDN], codecs, dictionary=b'other'))
+        self.assertIs(self.sender.compressor.codec, EvominCompressionCodec.ZLIB)
+
+    def test_payload_below_threshold_is_not_compressed(self):
+        self.negotiate_uart(create_compressor(threshold=len(PAYLOAD) + 1))
+        self.transfer(EvominFrameCommandType.SEND_IDN, PAYLOAD)
+        self.assertEqual(self.receiver.received, [PAYLOAD])
+        self.assertEqual(self.sender.compressor.stats.frames_compressed, 0)
+        self.assertEqual(self.sender.compressor.stats.frames_uncompressed, 1)
+
+    def test_command_not_opted_in_is_not_compressed(self):
+        self.negotiate_uart(EvominCompressor([], [EvominCompressionCodec.ZLIB]))
+        self.transfer(EvominFrameCommandType.SEND_IDN, PAYLOAD)
+        self.assertEqual(self.receiver.received, [PAYLOAD])
+        self.assertEqual(self.sender.compressor.stats.frames_compressed, 0)
+
+    def test_peer_without_compressor(self):
+        self.connect_uart(create_compressor(), None)
+        self.assertTrue(self.sender.negotiate_compression())
+        self.run_link(self.sender, self.receiver, 0.2)
+        self.run_link(self.receiver, self.sender, 0.2)
+        self.assertIsNone(self.sender.compressor.codec)
+        self.transfer(EvominFrameCommandType.SEND_IDN, PAYLOAD)
+        self.assertEqual(self.receiver.received, [PAYLOAD])
+        self.assertEqual(self.receiver.errors, [])
+
+    def test_corrupt_payload_is_dropped(self):
+        self.connect_uart(None, create_compressor())
+        corrupt: bytes = bytes([EvominFrameCommandType.SEND_IDN.value, EvominCompressionCodec.ZLIB.value]) + b'\xff' * 8
+        self.transfer(EvominFrameCommandType.COMPRESSED, corrupt)
+        self.assertEqual(self.receiver.received, [])
+        self.assertEqual(len(self.receiver.errors), 1)
+
+    def test_unknown_codec_is_dropped(self):
+        self.connect_uart(None, create_compressor())
+        header: bytes = bytes([EvominFrameCommandType.SEND_IDN.value, 0x7F])
+        self.transfer(EvominFrameCommandType.COMPRESSED, header + zlib.compress(PAYLOAD))
+        self.assertEqual(self.receiver.received, [])
+        self.assertEqual(len(self.receiver.errors), 1)
+
+    def test_payload_exceeding_buffer_size_is_rejected_before_compression(self):
+        self.negotiate_uart()
+        self.assertIs(self.sender.compressor.codec, EvominCompressionCodec.ZLIB)
+        self.assertFalse(self.sender.send(EvominFrameCommandType.SEND_IDN, b'A' * 200))
+        self.assertFalse(self.sender.send_many([(EvominFrameCommandType.SEND_IDN, b'A'),
+                                                (EvominFrameCommandType.SEND_IDN, b'A' * 200)]))
+        self.assertTrue(self.sender.frame_send_queue.empty())
+        self.assertEqual(len(self.sender.errors), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
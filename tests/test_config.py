@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from evomin.config import CONFIG_FIELDS, DEFAULT_CONFIG, EvominConfig
+
+
+class EvominConfigTest(unittest.TestCase):
+
+    def test_packaged_yaml_mirrors_defaults(self):
+        try:
+            import yaml  # noqa: F401
+        except ImportError:
+            self.skipTest('PyYAML is not installed')
+        self.assertEqual(EvominConfig.from_yaml(), DEFAULT_CONFIG)
+
+    def test_from_dict_covers_all_fields(self):
+        config_dict: dict = {}
+        for name, (section, key), default in CONFIG_FIELDS:
+            config_dict.setdefault(section, {})[key] = 'value of {}'.format(name)
+        config: EvominConfig = EvominConfig.from_dict(config_dict)
+        for name, _, _ in CONFIG_FIELDS:
+            self.assertEqual(getattr(config, name), 'value of {}'.format(name))
+
+    def test_unknown_value_is_rejected(self):
+        with self.assertRaises(TypeError):
+            EvominConfig(retry_cout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from evomin.config import EvominConfig
+from evomin.exceptions import EvominBufferOverflowException
+from evomin.frame import EvominFrameCommandType, EvominSendFrame
+
+
+class EvominFrameTest(unittest.TestCase):
+
+    def test_payload_exceeding_buffer_size_is_rejected(self):
+        with self.assertRaises(EvominBufferOverflowException):
+            EvominSendFrame(0xCD, bytes(60))
+
+    def test_payload_of_buffer_size_is_accepted(self):
+        config: EvominConfig = EvominConfig(buffer_size=60)
+        self.assertEqual(EvominSendFrame(0xCD, bytes(60), config).payload_buffer.size, 60)
+
+    def test_unknown_command_is_coerced_to_reserved_value(self):
+        frame: EvominSendFrame = EvominSendFrame(0x42, bytes([1]))
+        self.assertEqual(frame.command, EvominFrameCommandType.RESERVED.value)
+        self.assertIsInstance(frame.command, int)
+        self.assertEqual(frame.encode()[3], EvominFrameCommandType.RESERVED.value)
+
+
+if __name__ == '__main__':
+    unittest.main()
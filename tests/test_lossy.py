@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from evomin.com_fake import EvominFakeSPIInterface
+from evomin.com_lossy import EvominChannelModel, EvominLossyInterface
+
+
+class EvominLossyInterfaceTest(unittest.TestCase):
+
+    def test_receive_ends_with_wrapped_interface(self):
+        wrapped: EvominFakeSPIInterface = EvominFakeSPIInterface()
+        interface: EvominLossyInterface = EvominLossyInterface(wrapped, EvominChannelModel())
+        self.assertEqual(bytes(interface.receive_byte()), wrapped.test_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
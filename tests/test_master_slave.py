@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from typing import List, Tuple
+from evomin.com_fake import EvominFakeSPIBus
+from evomin.config import EvominConfig
+from evomin.frame import EvominFrame, EvominFrameCommandType
+from helpers import EvominLinkTestCase, RecordingEvomin
+
+
+class ReplyingEvomin(RecordingEvomin):
+    """Slave replying with reply_data to every received frame"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.reply_data: bytes = bytes()
+
+    def frame_received(self, frame: EvominFrame) -> None:
+        super().frame_received(frame)
+        self.reply(self.reply_data)
+
+
+class ChunkRecordingEvomin(RecordingEvomin):
+    """Master keeping every received reply segment"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.chunks: List[Tuple[bytes, int, bool]] = []
+
+    def reply_chunk_received(self, chunk: bytearray, offset: int, is_last: bool) -> None:
+        self.chunks.append((bytes(chunk), offset, is_last))
+        super().reply_chunk_received(chunk, offset, is_last)
+
+
+class MasterSlaveReplyTest(EvominLinkTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        # Frames are due right away, so every exchange takes a single poll
+        config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0)
+        bus: EvominFakeSPIBus = EvominFakeSPIBus()
+        self.master: ChunkRecordingEvomin = ChunkRecordingEvomin(bus, config, clock=self.clock)
+        self.slave: ReplyingEvomin = ReplyingEvomin(bus.slave_interface, config, clock=self.clock)
+        bus.attach(self.slave)
+
+    def exchange(self, payload: bytes, reply_data: bytes) -> None:
+        self.slave.reply_data = reply_data
+        self.assertTrue(self.master.send(EvominFrameCommandType.SEND_IDN, payload))
+        self.master.poll()
+        self.assertTrue(self.master.frame_send_queue.empty())
+
+    def test_reply_sizes(self):
+        for size in (1, 254, 255, 256, 510, 1000, 3000):
+            with self.subTest(size=size):
+                self.master.replies.clear()
+                reply_data: bytes = bytes(i % 256 for i in range(size))
+                self.exchange(bytes([size % 256]), reply_data)
+                self.assertEqual(self.master.replies, [reply_data])
+
+    def test_empty_reply_is_not_reported(self):
+        self.exchange(bytes([1]), bytes())
+        self.assertEqual(self.slave.received, [bytes([1])])
+        self.assertEqual(self.master.chunks, [])
+        self.assertEqual(self.master.replies, [])
+
+    def test_reply_segments(self):
+        self.exchange(bytes([1]), bytes(range(256)) * 3)
+        self.assertEqual([(len(chunk), offset, is_last) for chunk, offset, is_last in self.master.chunks],
+                         [(255, 0, False), (255, 255, False), (255, 510, False), (3, 765, True)])
+        self.assertEqual(b''.join(chunk for chunk, _, _ in self.master.chunks), bytes(range(256)) * 3)
+
+    def test_reply_of_exact_segment_multiple(self):
+        # The slave announces a zero-length segment after the second full one, which ends the reply
+        self.exchange(bytes([1]), bytes(510))
+        self.assertEqual([(len(chunk), offset, is_last) for chunk, offset, is_last in self.master.chunks],
+                         [(255, 0, False), (255, 255, True)])
+        self.assertEqual(self.master.replies, [bytes(510)])
+
+    def test_frame_after_full_segment_reply(self):
+        self.exchange(bytes([1]), bytes(255))
+        self.exchange(bytes([2]), bytes([0xDE, 0xAD]))
+        self.assertEqual(self.slave.received, [bytes([1]), bytes([2])])
+        self.assertEqual(self.master.replies, [bytes(255), bytes([0xDE, 0xAD])])
+        self.assertEqual(self.master.errors + self.slave.errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
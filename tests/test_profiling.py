@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import os
+import pstats
+import tempfile
+import time
+import unittest
+from evomin.com_fake import EvominFakeSPIBus, EvominFakeUARTInterface
+from evomin.com_lossy import EvominSimClock
+from evomin.config import EvominConfig
+from evomin.frame import EvominFrame, EvominFrameCommandType, EvominFrameMessageType, EvominSendFrame
+from evomin.profiling import EvominProfiler, EvominSendPhase, profile
+from helpers import RecordingEvomin
+
+
+class SlowEvomin(RecordingEvomin):
+    """Callbacks take one second on the profiler's clock"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.profiler_clock: EvominSimClock = self.profiler.clock
+
+    def frame_received(self, frame: EvominFrame) -> None:
+        super().frame_received(frame)
+        self.profiler_clock.advance(1.0)
+
+    def reply_chunk_received(self, chunk: bytearray, offset: int, is_last: bool) -> None:
+        self.profiler_clock.advance(1.0)
+        super().reply_chunk_received(chunk, offset, is_last)
+
+
+class ReplyingEvomin(RecordingEvomin):
+
+    def frame_received(self, frame: EvominFrame) -> None:
+        super().frame_received(frame)
+        self.reply(bytes([0xDE, 0xAD]))
+
+
+class EvominProfilerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0)
+
+    def test_callback_time_is_excluded_from_states(self):
+        interface, _ = EvominFakeUARTInterface.pair()
+        receiver: SlowEvomin = SlowEvomin(interface, self.config, profiler=EvominProfiler(EvominSimClock()))
+        for b in EvominSendFrame(EvominFrameCommandType.SEND_IDN.value, bytes([1])).encode():
+            receiver.process_byte(b)
+        receiver.process_byte(EvominFrameMessageType.EOF)
+        self.assertEqual(receiver.received, [bytes([1])])
+
+        profiler: EvominProfiler = receiver.profiler
+        self.assertEqual(profiler.callbacks['frame_received'].total, 1.0)
+        self.assertEqual(profiler.callback_time, 1.0)
+        self.assertEqual(profiler.states['StateEof'].calls, 1)
+        self.assertEqual(profiler.protocol_time, 0.0)
+
+    def test_callback_time_is_excluded_from_send_phases(self):
+        bus: EvominFakeSPIBus = EvominFakeSPIBus()
+        master: SlowEvomin = SlowEvomin(bus, self.config, profiler=EvominProfiler(EvominSimClock()))
+        slave: ReplyingEvomin = ReplyingEvomin(bus.slave_interface, self.config)
+        bus.attach(slave)
+        self.assertTrue(master.send(EvominFrameCommandType.SEND_IDN, bytes([1])))
+        master.poll()
+        self.assertEqual(master.replies, [bytes([0xDE, 0xAD])])
+
+        profiler: EvominProfiler = master.profiler
+        self.assertEqual(set(profiler.send_phases), set(EvominSendPhase))
+        self.assertEqual(profiler.callbacks['reply_chunk_received'].total, 1.0)
+        self.assertEqual(profiler.callback_time, 1.0)
+        self.assertEqual(profiler.protocol_time, 0.0)
+
+    def test_profile_writes_pstats_and_collapsed_stacks(self):
+        interface, _ = EvominFakeUARTInterface.pair()
+        evomin: RecordingEvomin = RecordingEvomin(interface, self.config)
+        with tempfile.TemporaryDirectory() as directory:
+            pstats_file: str = os.path.join(directory, 'evomin.pstats')
+            collapsed_file: str = os.path.join(directory, 'evomin.collapsed')
+            with profile(pstats_file=pstats_file, collapsed_file=collapsed_file, sample_interval=0.001):
+                end: float = time.perf_counter() + 0.1
+                while time.perf_counter() < end:
+                    evomin.poll()
+
+            stats: pstats.Stats = pstats.Stats(pstats_file)
+            self.assertTrue(any(name == 'poll' for _, _, name in stats.stats))
+            with open(collapsed_file) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines)
+            stack, count = lines[0].rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertIn(';', stack)
+
+
+if __name__ == '__main__':
+    unittest.main()
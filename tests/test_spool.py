@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import tempfile
+import unittest
+from unittest import mock
+from typing import List
+from evomin.com_fake import EvominFakeUARTInterface
+from evomin.config import EvominConfig
+from evomin.frame import EvominFrameCommandType
+from evomin.spool import EvominSpool, _EvominSpoolSegment
+from helpers import EvominLinkTestCase, RecordingEvomin
+
+
+class EvominSpoolTest(EvominLinkTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0.1)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def create_sender(self, interface: EvominFakeUARTInterface) -> RecordingEvomin:
+        return RecordingEvomin(interface, self.config, clock=self.clock, spool=EvominSpool(self.directory.name))
+
+    def run_offline(self, sender: RecordingEvomin, seconds: float) -> None:
+        for _ in range(int(seconds / 0.01)):
+            sender.poll()
+            sender.com_interface.tx.clear()
+            self.clock.advance(0.01)
+
+    def test_spool_is_kept_while_peer_is_offline(self):
+        sender_interface, receiver_interface = EvominFakeUARTInterface.pair()
+        sender: RecordingEvomin = self.create_sender(sender_interface)
+        for i in range(50):
+            self.assertTrue(sender.send(EvominFrameCommandType.SEND_IDN, bytes([i])))
+        self.run_offline(sender, 10)
+        # Only the frames queued in memory right away ran through their retries, the spooled ones are still there
+        queued: int = self.config.max_queued_frames
+        self.assertEqual(len(sender.spool) + sender.frame_send_queue.qsize(), 50 - queued)
+
+        receiver: RecordingEvomin = RecordingEvomin(receiver_interface, self.config, clock=self.clock)
+        self.run_link(sender, receiver, 2)
+        self.assertEqual(sorted(set(receiver.received)), [bytes([i]) for i in range(queued, 50)])
+        self.assertEqual(len(sender.spool), 0)
+
+    def test_unacknowledged_frames_survive_restart(self):
+        sender_interface, _ = EvominFakeUARTInterface.pair()
+        sender: RecordingEvomin = self.create_sender(sender_interface)
+        for i in range(20):
+            sender.send(EvominFrameCommandType.SEND_IDN, bytes([i]))
+        self.run_offline(sender, 1)
+        # Frames have been moved from the spool into the send queue, but haven't been acknowledged
+        self.assertLess(len(sender.spool), 20 - self.config.max_queued_frames)
+        sender.spool.close()
+
+        sender_interface, receiver_interface = EvominFakeUARTInterface.pair()
+        sender = self.create_sender(sender_interface)
+        self.assertEqual(len(sender.spool), 20 - self.config.max_queued_frames)
+        receiver: RecordingEvomin = RecordingEvomin(receiver_interface, self.config, clock=self.clock)
+        self.run_link(sender, receiver, 2)
+        self.assertEqual(receiver.received, [bytes([i]) for i in range(self.config.max_queued_frames, 20)])
+
+    def test_sync_writes_flushes_every_written_segment(self):
+        spool: EvominSpool = EvominSpool(self.directory.name, segment_size=1024, sync_writes=True)
+        with mock.patch.object(_EvominSpoolSegment, 'flush', autospec=True,
+                               side_effect=_EvominSpoolSegment.flush) as flush:
+            self.assertTrue(spool.push_many([bytes(300)] * 5))
+        flushed: List[int] = [call.args[0].index for call in flush.call_args_list]
+        self.assertEqual(len(spool.segments), 2)
+        self.assertEqual(sorted(set(flushed)), [0, 1])
+        spool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
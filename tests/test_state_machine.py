@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from evomin.com_fake import EvominFakeSPIBus, EvominFakeUARTInterface
+from evomin.config import EvominConfig
+from evomin.frame import EvominFrame, EvominFrameCommandType, EvominFrameMessageType, EvominSendFrame
+from helpers import EvominLinkTestCase, RecordingEvomin
+
+
+class ReplyingEvomin(RecordingEvomin):
+    """Slave replying with two bytes to every received frame"""
+    def frame_received(self, frame: EvominFrame) -> None:
+        super().frame_received(frame)
+        self.reply(bytes([0xDE, 0xAD]))
+
+
+def encode(payload: bytes) -> bytes:
+    return EvominSendFrame(EvominFrameCommandType.SEND_IDN.value, payload).encode()
+
+
+class EvominStateMachineTest(EvominLinkTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0.1)
+
+    def feed(self, evomin: RecordingEvomin, data: bytes) -> None:
+        for b in data:
+            evomin.process_byte(b)
+
+    def test_error_state_resynchronizes_on_sof(self):
+        interface, _ = EvominFakeUARTInterface.pair()
+        receiver: RecordingEvomin = RecordingEvomin(interface, self.config, clock=self.clock)
+        # The EOF of the first frame is corrupted, the next frame follows right away
+        self.feed(receiver, encode(bytes([1])) + bytes([0x00]))
+        self.feed(receiver, encode(bytes([2])) + bytes([EvominFrameMessageType.EOF]))
+        self.assertEqual(receiver.received, [bytes([2])])
+        self.assertEqual(len(receiver.errors), 1)
+        self.assertIs(receiver.state.current_state, receiver.state.state_idle)
+
+    def test_slave_returns_to_idle_after_closing_byte(self):
+        slave: ReplyingEvomin = ReplyingEvomin(EvominFakeSPIBus().slave_interface, self.config, clock=self.clock)
+        frame: bytes = encode(bytes([1])) + bytes([EvominFrameMessageType.EOF] * 2 + [EvominFrameMessageType.DUMMY] * 2)
+        self.feed(slave, frame)
+        self.assertIs(slave.state.current_state, slave.state.state_reply_end)
+        self.feed(slave, bytes([EvominFrameMessageType.ACK]))
+        self.assertIs(slave.state.current_state, slave.state.state_idle)
+        self.assertEqual(slave.errors, [])
+
+    def test_slave_resynchronizes_on_lost_closing_byte(self):
+        slave: ReplyingEvomin = ReplyingEvomin(EvominFakeSPIBus().slave_interface, self.config, clock=self.clock)
+        exchange = bytes([EvominFrameMessageType.EOF] * 2 + [EvominFrameMessageType.DUMMY] * 2)
+        # The master's closing ACK of the first exchange is lost
+        self.feed(slave, encode(bytes([1])) + exchange + encode(bytes([2])) + exchange
+                  + bytes([EvominFrameMessageType.ACK]))
+        self.assertEqual(slave.received, [bytes([1]), bytes([2])])
+        self.assertIs(slave.state.current_state, slave.state.state_idle)
+        self.assertEqual(slave.errors, [])
+
+    def test_late_ack_of_dropped_frame_is_ignored(self):
+        sender_interface, receiver_interface = EvominFakeUARTInterface.pair()
+        config: EvominConfig = EvominConfig(use_logging=False, resend_min_time=0.1, retry_count=1)
+        sender: RecordingEvomin = RecordingEvomin(sender_interface, config, clock=self.clock)
+        receiver: RecordingEvomin = RecordingEvomin(receiver_interface, config, clock=self.clock)
+        self.assertTrue(sender.send(EvominFrameCommandType.SEND_IDN, bytes([1])))
+        self.clock.advance(0.1)
+        sender.poll()
+        # No ACK within resend_min_time, the frame is out of retries
+        self.clock.advance(0.2)
+        sender.poll()
+        self.assertTrue(sender.frame_send_queue.empty())
+        sender.process_byte(EvominFrameMessageType.ACK)
+        self.assertEqual(sender.ack_batch, [])
+
+        # The next frame is sent and acknowledged as usual
+        sender_interface.tx.clear()
+        self.assertTrue(sender.send(EvominFrameCommandType.SEND_IDN, bytes([2])))
+        self.clock.advance(0.1)
+        self.run_link(sender, receiver, 0.05)
+        self.assertEqual(receiver.received, [bytes([2])])
+        self.assertTrue(sender.frame_send_queue.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
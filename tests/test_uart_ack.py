@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*
+import unittest
+from typing import List, Optional, Set
+from evomin.com_fake import EvominFakeUARTInterface
+from evomin.config import DEFAULT_CONFIG, EvominConfig
+from evomin.frame import EvominFrameCommandType, EvominFrameMessageType
+from helpers import EvominLinkTestCase, RecordingEvomin
+
+
+class DroppingUARTInterface(EvominFakeUARTInterface):
+    """Fake UART end that loses the n-th sent bytes (counted from 0)"""
+    def __init__(self, rx, tx) -> None:
+        super().__init__(rx, tx)
+        self.drop: Set[int] = set()
+        self.sent: int = 0
+        self.writes: int = 0
+
+    def send_byte(self, byte: int) -> Optional[int]:
+        index: int = self.sent
+        self.sent += 1
+        if index not in self.drop:
+            self.tx.append(byte)
+        return None
+
+    def send_bytes(self, data: bytes) -> None:
+        self.writes += 1
+        for b in data:
+            self.send_byte(b)
+
+
+class UARTAckTest(EvominLinkTestCase):
+
+    def connect(self, config: EvominConfig) -> None:
+        self.sender_interface, self.receiver_interface = DroppingUARTInterface.pair()
+        self.sender: RecordingEvomin = RecordingEvomin(self.sender_interface, config, clock=self.clock)
+        self.receiver: RecordingEvomin = RecordingEvomin(self.receiver_interface, config, clock=self.clock)
+
+    def send_frames(self, count: int) -> None:
+        self.assertTrue(self.sender.send_many([(EvominFrameCommandType.SEND_IDN, bytes([i]))
+                                               for i in range(count)]))
+        self.clock.advance(self.sender.config.resend_min_time)
+
+    def test_coalescing_is_disabled_by_default(self):
+        self.assertEqual(DEFAULT_CONFIG.max_coalesced_frames, 1)
+
+    def test_lost_ack_resends_frame(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1))
+        # The receiver's first ACK gets lost
+        self.receiver_interface.drop = {0}
+        self.send_frames(1)
+        self.run_link(self.sender, self.receiver, 0.5)
+        self.assertEqual(self.receiver.received, [bytes([0]), bytes([0])])
+        self.assertTrue(self.sender.frame_send_queue.empty())
+
+    def test_lost_ack_in_batch_resends_whole_batch(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1, max_coalesced_frames=0))
+        # The ACK of the second frame of the batch gets lost
+        self.receiver_interface.drop = {1}
+        self.send_frames(3)
+        self.run_link(self.sender, self.receiver, 0.5)
+        self.assertEqual(self.sender_interface.writes, 2)
+        self.assertEqual(self.receiver.received, [bytes([i]) for i in (0, 1, 2, 0, 1, 2)])
+        self.assertTrue(self.sender.frame_send_queue.empty())
+
+    def test_lost_frame_in_batch_is_not_acknowledged_by_later_acks(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1, max_coalesced_frames=0))
+        # The first SOF of the first frame gets lost, so only the second and third frame are acknowledged
+        self.sender_interface.drop = {0}
+        self.send_frames(3)
+        self.run_link(self.sender, self.receiver, 0.5)
+        self.assertEqual(sorted(set(self.receiver.received)), [bytes([0]), bytes([1]), bytes([2])])
+        self.assertTrue(self.sender.frame_send_queue.empty())
+
+    def test_unexpected_byte_aborts_batch(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1, max_coalesced_frames=0))
+        self.send_frames(2)
+        self.sender.poll()
+        self.assertEqual(len(self.sender.ack_batch), 2)
+        for byte in (EvominFrameMessageType.ACK, EvominFrameMessageType.NACK, EvominFrameMessageType.ACK):
+            self.sender.process_byte(byte)
+        self.assertEqual(self.sender.ack_batch, [])
+        self.assertFalse(any(f.is_sent or f.waiting_for_ack for f in self.sender.frame_send_queue.queue))
+        self.assertEqual(self.sender.frame_send_queue.qsize(), 2)
+
+    def test_frame_acknowledged_on_last_attempt_is_not_dropped(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1, retry_count=1))
+        self.send_frames(1)
+        self.run_link(self.sender, self.receiver, 0.5)
+        self.assertEqual(self.receiver.received, [bytes([0])])
+        self.assertEqual(self.sender.errors, [])
+        self.assertTrue(self.sender.frame_send_queue.empty())
+
+    def test_frame_is_dropped_after_last_failed_attempt(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1, retry_count=2))
+        self.send_frames(1)
+        # The peer is offline
+        self.run_link(self.sender, self.receiver, 1, receiver_polls=0)
+        self.assertEqual(self.sender_interface.writes, 2)
+        self.assertEqual(len(self.sender.errors), 1)
+        self.assertTrue(self.sender.frame_send_queue.empty())
+
+    def test_write_happens_without_queue_lock(self):
+        self.connect(EvominConfig(use_logging=False, resend_min_time=0.1))
+        locked: List[bool] = []
+        send_bytes = self.sender_interface.send_bytes
+
+        def checking_send_bytes(data: bytes) -> None:
+            locked.append(self.sender.frame_send_queue.mutex.locked())
+            # A transport calling back into the instance must not deadlock
+            self.sender.send(EvominFrameCommandType.SEND_IDN, bytes([0xFF]))
+            send_bytes(data)
+
+        self.sender_interface.send_bytes = checking_send_bytes
+        self.send_frames(1)
+        self.sender.poll()
+        self.assertEqual(locked, [False])
+
+
+if __name__ == '__main__':
+    unittest.main()